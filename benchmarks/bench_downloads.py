@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import comic  # noqa: E402
+from comic_server import ComicServer  # noqa: E402
+
+SOURCES = {
+    "xkcd": "XKCD",
+    "dilbert": "Dilbert",
+    "smbc": "SMBC",
+    "oatmeal": "The Oatmeal",
+    "cyanide": "Cyanide & Happiness",
+    "gallery": "Custom_Comic",
+}
+
+
+class BenchDownloader(comic.ComicDownloader):
+    def __init__(self, verbose=False, **kwargs):
+        super().__init__(**kwargs)
+        self.verbose = verbose
+        self.latencies = []
+
+    def log_message(self, message):
+        if self.verbose:
+            super().log_message(message)
+
+    def _download_image(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._download_image(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def create_async_engine(self):
+        engine = super().create_async_engine()
+        download_image = engine._download_image
+
+        async def timed_download_image(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await download_image(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        engine._download_image = timed_download_image
+        return engine
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork+exec and would include the parent's server, VmHWM does not.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def folder_stats(folder):
+    count = total = 0
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if not filename.endswith(('.part', '.link')):
+                count += 1
+                total += os.path.getsize(os.path.join(dirpath, filename))
+    return count, total
+
+
+def run_source(args):
+    comic_name = SOURCES[args.child]
+    save_path = tempfile.mkdtemp(prefix="comic-bench-")
+    try:
+        downloader = BenchDownloader(verbose=args.verbose, save_path=save_path,
+                                     max_comics=args.count, workers=args.workers,
+                                     async_engine=args.engine == 'asyncio',
+                                     settings={'comics': json.loads(args.comics)})
+        start = time.perf_counter()
+        if comic_name == "Custom_Comic":
+            downloader.download_comics([], custom_url=args.gallery)
+        else:
+            downloader.download_comics([comic_name])
+        elapsed = time.perf_counter() - start
+        downloader.close()
+
+        items, total_bytes = folder_stats(os.path.join(save_path, comic.comic_folder_name(comic_name)))
+        return {
+            "source": args.child,
+            "engine": args.engine,
+            "items": items,
+            "bytes": total_bytes,
+            "seconds": elapsed,
+            "comics_per_s": items / elapsed if elapsed else 0.0,
+            "mb_per_s": total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(downloader.latencies, 50) * 1000,
+            "p99_ms": percentile(downloader.latencies, 99) * 1000,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(save_path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the download engines offline against a local stand-in comic server.")
+    parser.add_argument("--source", action="append", choices=list(SOURCES),
+                        help="source to benchmark (repeatable, default: all)")
+    parser.add_argument("--engine", choices=["threads", "asyncio", "both"], default="threads")
+    parser.add_argument("--count", type=int, default=200, help="max comics per source")
+    parser.add_argument("--workers", type=int, default=comic.DEFAULT_WORKERS)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--bandwidth-kb", type=float, default=0.0, help="per-response KB/s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="client-side requests/s per host (0 = no politeness limit)")
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the downloader log")
+    parser.add_argument("--child", choices=list(SOURCES), help=argparse.SUPPRESS)
+    parser.add_argument("--comics", help=argparse.SUPPRESS)
+    parser.add_argument("--gallery", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_source(args)))
+        return
+
+    server = ComicServer(latency=args.latency_ms / 1000, bandwidth=args.bandwidth_kb * 1024 or None,
+                         error_rate=args.error_rate, image_size=args.image_kb * 1024).start()
+    engines = ["threads", "asyncio"] if args.engine == "both" else [args.engine]
+    comics = {name: {'url': url, 'rate': args.rate} for name, url in server.comic_urls().items()}
+    comics["Custom_Comic"] = {'rate': args.rate}
+    results = []
+    try:
+        print(f"{'source':10} {'engine':8} {'items':>6} {'comics/s':>9} {'MB/s':>8} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'peak RSS':>9}")
+        for source in args.source or list(SOURCES):
+            for engine in engines:
+                # Each run gets its own interpreter so peak RSS is per source.
+                command = [sys.executable, os.path.abspath(__file__), "--child", source,
+                           "--engine", engine, "--count", str(args.count),
+                           "--workers", str(args.workers),
+                           "--comics", json.dumps(comics), "--gallery", server.gallery_url()]
+                if args.verbose:
+                    command.append("--verbose")
+                output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{source:10} {engine:8} {result['items']:6d} {result['comics_per_s']:9.1f} "
+                      f"{result['mb_per_s']:8.2f} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f} "
+                      f"{result['peak_rss_mb']:7.1f}MB")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"settings": {"count": args.count, "workers": args.workers,
+                                    "latency_ms": args.latency_ms, "bandwidth_kb": args.bandwidth_kb,
+                                    "error_rate": args.error_rate, "rate": args.rate,
+                                    "image_kb": args.image_kb},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
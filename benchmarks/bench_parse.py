@@ -0,0 +1,106 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comic  # noqa: E402
+
+BASE_URL = "https://example.com/"
+
+EXTRACTORS = {
+    "smbc": (lambda soup: comic.find_latest_comic(soup, 'cc-comic', 'smbc'),
+             SoupStrainer(**{'name': 'img', 'id': 'cc-comic'})),
+    "cyanide": (lambda soup: comic.find_latest_comic(soup, 'main-comic', 'cyanide'),
+                SoupStrainer(**{'name': 'img', 'id': 'main-comic'})),
+    "dilbert": (lambda soup: comic.find_dilbert_comic(soup, BASE_URL + "strip/2023-03-12", BASE_URL),
+                SoupStrainer(**comic.NAVIGATION_TAGS)),
+    "oatmeal": (lambda soup: list(comic.find_oatmeal_images(soup, BASE_URL)),
+                SoupStrainer(**comic.IMAGE_TAGS)),
+    "generic": (lambda soup: list(comic.find_generic_images(soup, BASE_URL)),
+                SoupStrainer(**comic.IMAGE_TAGS)),
+}
+
+
+def synthetic_page(source, blocks=400, gallery=600):
+    parts = ["<!DOCTYPE html><html><head><title>Comic</title>"]
+    parts += [f"<script>var x{i} = {{'a': {i}, 'b': 'filler text {i}'}};</script>" for i in range(20)]
+    parts.append("</head><body><div id='nav'>")
+    parts += [f"<a href='/archive/{i}' class='nav-link'>Archive {i}</a>" for i in range(50)]
+    parts.append("<img src='/images/logo.png' alt='logo'></div><main>")
+    for i in range(blocks):
+        parts.append(f"<div class='post'><h2>Post {i}</h2><p>{'Lorem ipsum dolor sit amet. ' * 8}"
+                     f"<a href='/post/{i}'>more</a></p><span class='meta'>{i}</span></div>")
+    if source == "smbc":
+        parts.append("<img id='cc-comic' src='https://cdn.example.com/comics/1690000000-strip.png'>")
+    elif source == "cyanide":
+        parts.append("<img id='main-comic' src='//files.example.com/comics/cyanide-strip.png'>")
+    elif source == "dilbert":
+        parts.append("<img class='img-responsive img-comic' src='https://assets.example.com/dilbert/2023-03-12.gif'>"
+                     "<a rel='prev' href='/strip/2023-03-11'>Previous</a>")
+    else:
+        parts += [f"<figure><img src='/comics/strip_{i}.png' alt='strip {i}'>"
+                  f"<img src='/icons/share_{i}.gif'></figure>" for i in range(gallery)]
+    parts.append("</main></body></html>")
+    return "".join(parts).encode()
+
+
+def measure(content, extractor, parser, parse_only, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extractor(BeautifulSoup(content, parser, parse_only=parse_only))
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    extractor(BeautifulSoup(content, parser, parse_only=parse_only))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare full BeautifulSoup trees with targeted extraction on saved comic pages.")
+    parser.add_argument("--page", action="append", default=[], metavar="SOURCE=FILE",
+                        help=f"saved page to benchmark, SOURCE is one of {', '.join(EXTRACTORS)} "
+                             "(default: synthetic pages for every source)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = []
+    for spec in args.page:
+        source, _, path = spec.partition("=")
+        with open(path, 'rb') as f:
+            pages.append((source, path, f.read()))
+    if not pages:
+        pages = [(source, "synthetic", synthetic_page(source)) for source in EXTRACTORS]
+
+    strategies = [("full tree", 'html.parser', False), ("targeted", 'html.parser', True)]
+    if comic.HTML_PARSER != 'html.parser':
+        strategies.append(("targeted", comic.HTML_PARSER, True))
+
+    print(f"{'source':<9} {'page':<10} {'KiB':>6}  {'strategy':<22} {'ms':>8} {'peak KiB':>9}  speedup")
+    for source, label, content in pages:
+        extractor, strainer = EXTRACTORS[source]
+        baseline_time = baseline_result = None
+        for name, html_parser, targeted in strategies:
+            elapsed, peak, result = measure(content, extractor, html_parser,
+                                            strainer if targeted else None, args.repeat)
+            if baseline_time is None:
+                baseline_time, baseline_result = elapsed, result
+            elif result != baseline_result:
+                print(f"!! {source}: {name}/{html_parser} extracted different results")
+            print(f"{source:<9} {label[-10:]:<10} {len(content) // 1024:>6}  {name + ' ' + html_parser:<22} "
+                  f"{elapsed * 1000:>8.2f} {peak // 1024:>9}  {baseline_time / elapsed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
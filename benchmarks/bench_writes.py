@@ -0,0 +1,95 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import comic  # noqa: E402
+
+SOURCE = "Bench"
+
+
+class QuietDownloader(comic.ComicDownloader):
+    def log_message(self, message):
+        if message.startswith("❌"):
+            super().log_message(message)
+
+
+def start_server(image_kb):
+    # The server runs in its own process so process_time() only counts the client.
+    server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "comic_server.py"), "--port", "0",
+                               "--image-kb", str(image_kb)], stdout=subprocess.PIPE, text=True)
+    base_url = server.stdout.readline().split()[-1].rsplit("/xkcd/", 1)[0]
+    return server, base_url
+
+
+def previous_write_path(downloader, img_url, filepath):
+    part = comic.PartFile(filepath)
+    with downloader.http.stream(img_url, source=SOURCE) as response:
+        response.raise_for_status()
+        part.open(response.status_code, response.headers)
+        for chunk in response.iter_content(chunk_size=8192):
+            if downloader.stop_event.is_set():
+                part.close()
+                return False
+            part.write(chunk)
+    return part.commit()
+
+
+def tuned_write_path(downloader, img_url, filepath):
+    return downloader._fetch_image(img_url, filepath, os.path.basename(filepath), None, None, 1)
+
+
+def measure(downloader, folder, base_url, name, write_path, files):
+    cpu = wall = 0.0
+    total = 0
+    for i in range(files):
+        filepath = os.path.join(folder, f"{name}_{i}.png")
+        img_url = f"{base_url}/images/bench/{name}_{i}.png"
+        downloader.http.get(img_url, source=SOURCE).close()  # let the server build the image first
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        if not write_path(downloader, img_url, filepath):
+            raise SystemExit(f"{name}: download of {img_url} failed")
+        cpu += time.process_time() - cpu_start
+        wall += time.perf_counter() - wall_start
+        total += os.path.getsize(filepath)
+    mb = total / (1024 * 1024)
+    return {"path": name, "mb": mb, "cpu_ms_per_mb": cpu * 1000 / mb, "mb_per_s": mb / wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare client CPU per MB of the image write path against a local server.")
+    parser.add_argument("--image-mb", type=float, default=16.0)
+    parser.add_argument("--files", type=int, default=8)
+    args = parser.parse_args()
+
+    server, base_url = start_server(int(args.image_mb * 1024))
+    save_path = tempfile.mkdtemp(prefix="comic-bench-")
+    try:
+        downloader = QuietDownloader(save_path=save_path)
+        downloader.ensure_manifest()
+        downloader.ensure_http_client()
+        downloader.politeness.configure(SOURCE, {'rate': 0})
+        folder = os.path.join(save_path, SOURCE)
+        os.makedirs(folder)
+
+        print(f"{'path':10} {'MB':>8} {'CPU ms/MB':>10} {'MB/s':>8}")
+        results = [measure(downloader, folder, base_url, name, write_path, args.files)
+                   for name, write_path in (("previous", previous_write_path), ("tuned", tuned_write_path))]
+        for result in results:
+            print(f"{result['path']:10} {result['mb']:8.1f} {result['cpu_ms_per_mb']:10.2f} "
+                  f"{result['mb_per_s']:8.1f}")
+        print(f"CPU per MB: {results[0]['cpu_ms_per_mb'] / results[1]['cpu_ms_per_mb']:.2f}x lower")
+    finally:
+        server.kill()
+        shutil.rmtree(save_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
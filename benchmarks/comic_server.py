@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATEST_DILBERT = date(2023, 3, 12)
+CHUNK_SIZE = 16 * 1024
+
+
+def png_bytes(seed, size):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 640, 480, 8, 2, 0, 0, 0))
+    payload = hashlib.sha256(seed.encode()).digest() * (max(size - len(header) - 24, 32) // 32)
+    return header + chunk(b'IDAT', payload) + chunk(b'IEND', b'')
+
+
+class ComicServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, bandwidth=None, error_rate=0.0,
+                 image_size=64 * 1024, xkcd_latest=2500, dilbert_strips=2000, gallery_size=2000,
+                 site_pages=20000, seed=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self.xkcd_latest = xkcd_latest
+        self.dilbert_strips = dilbert_strips
+        self.gallery_size = gallery_size
+        self.site_pages = site_pages
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.images = {}
+        self.images_lock = threading.Lock()
+
+        server = self
+
+        class Handler(ComicRequestHandler):
+            comic_server = server
+
+        self.httpd = ComicHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def comic_urls(self):
+        return {
+            "XKCD": f"{self.base_url}/xkcd/",
+            "Dilbert": f"{self.base_url}/dilbert/strip",
+            "SMBC": f"{self.base_url}/smbc/",
+            "The Oatmeal": f"{self.base_url}/oatmeal/",
+            "Cyanide & Happiness": f"{self.base_url}/cyanide/comics/latest",
+        }
+
+    def gallery_url(self):
+        return f"{self.base_url}/gallery/"
+
+    def site_url(self):
+        return f"{self.base_url}/site/page/1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.random_lock:
+            return self.random.random() < self.error_rate
+
+    def image(self, path):
+        with self.images_lock:
+            body = self.images.get(path)
+            if body is None:
+                body = self.images[path] = png_bytes(path, self.image_size)
+            return body
+
+    def dilbert_page(self, day):
+        strip = day.isoformat()
+        prev_link = ""
+        if (LATEST_DILBERT - day).days + 1 < self.dilbert_strips:
+            prev_link = f"<a rel='prev' href='/dilbert/strip/{(day - timedelta(days=1)).isoformat()}'>Previous</a>"
+        return page(f"<img class='img-responsive img-comic' src='{self.base_url}/images/dilbert/{strip}.png'>"
+                    + prev_link)
+
+    def site_page(self, num):
+        # Pagination plus archive links that revisit pages under tracking params and fragments.
+        links = [f"<a rel='next' href='/site/page/{num + 1}'>Next</a>" if num < self.site_pages else "",
+                 f"<a rel='prev' href='/site/page/{num - 1}'>Prev</a>" if num > 1 else "",
+                 "<a href='/site/page/1?utm_source=nav#top'>First</a>",
+                 "<a href='/site/about.pdf'>About</a>"]
+        links += [f"<a href='/site/page/{(num * 7 + i * 13) % self.site_pages + 1}'>Archive</a>" for i in range(3)]
+        return page(f"<img src='/images/site/{num}_a.png'><img src='/images/site/{num}_b.png'>"
+                    f"<img src='/images/site/icon_{num}.png'>" + "".join(links))
+
+    def route(self, path):
+        if path == "/xkcd/info.0.json":
+            return 'application/json', self.xkcd_json(self.xkcd_latest)
+        match = re.fullmatch(r"/xkcd/(\d+)/info\.0\.json", path)
+        if match:
+            num = int(match.group(1))
+            if num < 1 or num > self.xkcd_latest or num == 404:
+                return None
+            return 'application/json', self.xkcd_json(num)
+        if path == "/dilbert/strip":
+            return 'text/html', self.dilbert_page(LATEST_DILBERT)
+        match = re.fullmatch(r"/dilbert/strip/(\d{4}-\d{2}-\d{2})", path)
+        if match:
+            return 'text/html', self.dilbert_page(date.fromisoformat(match.group(1)))
+        if path == "/smbc/":
+            return 'text/html', page(f"<img id='cc-comic' src='{self.base_url}/images/smbc/latest.png'>")
+        if path == "/cyanide/comics/latest":
+            return 'text/html', page(f"<img id='main-comic' src='{self.base_url}/images/cyanide/latest.png'>")
+        if path == "/oatmeal/":
+            return 'text/html', page("".join(f"<a href='/comics/{i}'><img src='/comics/oatmeal_{i}.png'></a>"
+                                             for i in range(200)))
+        if path == "/gallery/":
+            return 'text/html', page("".join(f"<figure><img src='/images/gallery/strip_{i}.jpg'>"
+                                             f"<img src='/icons/share_{i}.gif'></figure>"
+                                             for i in range(self.gallery_size)))
+        match = re.fullmatch(r"/site/page/(\d+)", path)
+        if match and 1 <= int(match.group(1)) <= self.site_pages:
+            return 'text/html', self.site_page(int(match.group(1)))
+        if path.startswith("/images/") or path.startswith("/comics/"):
+            return 'image/png', self.image(path)
+        return None
+
+    def xkcd_json(self, num):
+        return json.dumps({"num": num, "safe_title": f"Comic {num}",
+                           "img": f"{self.base_url}/images/xkcd/{num}.png"}).encode()
+
+
+class ComicHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops SYNs when a client opens dozens of
+    # connections at once, which shows up as one-second connect stalls.
+    request_queue_size = 1024
+
+
+def page(body):
+    filler = "".join(f"<div class='post'><p>{'Lorem ipsum dolor sit amet. ' * 6}</p></div>" for _ in range(40))
+    return (f"<!DOCTYPE html><html><head><title>Comic</title></head><body>"
+            f"<img src='/images/logo.png' alt='logo'>{filler}<main>{body}</main></body></html>").encode()
+
+
+class ComicRequestHandler(BaseHTTPRequestHandler):
+    comic_server = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.comic_server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.should_fail():
+            return self.send_body(503, 'text/plain', b'unavailable', {'Retry-After': '1'})
+
+        routed = server.route(self.path.split('?', 1)[0])
+        if routed is None:
+            return self.send_body(404, 'text/plain', b'not found')
+
+        content_type, body = routed
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            return self.send_body(304, content_type, b'', {'ETag': etag})
+
+        status, headers = 200, {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get('Range', ''))
+        if match and content_type.startswith('image/'):
+            start = int(match.group(1))
+            if start >= len(body):
+                return self.send_body(416, 'text/plain', b'', {'Content-Range': f"bytes */{len(body)}"})
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            body = body[start:]
+        self.send_body(status, content_type, body, headers)
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        bandwidth = self.comic_server.bandwidth
+        try:
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stand-in comic sites for offline benchmarks.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--bandwidth-kb", type=float, default=0.0, help="per-response KB/s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    server = ComicServer(port=args.port, latency=args.latency_ms / 1000,
+                         bandwidth=args.bandwidth_kb * 1024 or None, error_rate=args.error_rate,
+                         image_size=args.image_kb * 1024)
+    for name, url in server.comic_urls().items():
+        print(f"{name:22} {url}")
+    print(f"{'Gallery':22} {server.gallery_url()}")
+    print(f"{'Site (crawl)':22} {server.site_url()}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
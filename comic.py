@@ -1,35 +1,3372 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import argparse
+import importlib.util
 import os
+import signal
+import sys
 import threading
-from datetime import datetime
+import asyncio
+import queue
+import sqlite3
+import hashlib
+import heapq
+import itertools
+import codecs
+import time
+import shutil
+import struct
+import zipfile
+from collections import deque, namedtuple
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import json
-from urllib.parse import urljoin, urlparse
+import math
+import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import asynccontextmanager, contextmanager
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+# tkinter, bs4 and aiohttp are imported on first use so the headless mode starts fast
+# and runs on servers without Tk.
+tk = ttk = messagebox = scrolledtext = filedialog = None
+aiohttp = None
+
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
 
 CONFIG_FILE = "comic_downloader_config.json"
+MANIFEST_FILE = "comic_manifest.db"
+WORK_QUEUE_FILE = "work_queue.db"
+HTTP_CACHE_FILE = "http_cache.db"
+CONTENT_STORE_DIR = ".content_store"
+QUARANTINE_DIR = ".quarantine"
+RUN_REPORT_FILE = "run_report.json"
+CRAWL_STATE_FILE = ".crawl_state.db"
+DEFAULT_WORKERS = 8
+UI_REFRESH_MS = 100
+MAX_LOG_LINES = 2000
+STATUS_REFRESH_S = 0.5
+VERIFY_WORKERS = 2
+SNIFF_WINDOW = 64 * 1024
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+DEFAULT_SETTINGS = {
+    'pool_connections': 10,
+    'pool_maxsize': 16,
+    'timeout': 10,
+    'max_connections': 16,
+    'max_per_host': 6,
+    'async_max_in_flight': 256,
+    'async_max_per_host': 32,
+    'http_cache_mb': 64,
+    'content_store': False,
+    'crawl_lookahead': 4,
+    'stream_html': False,
+    'comics': {},
+    'metrics_port': 0,
+    'max_bandwidth_kb': 0,
+    'latest_window': 10,
+    'crawl_pages': 0,
+    'crawl_depth': 3,
+    'cbz_output': False,
+    'verify_images': True,
+}
+
+DEFAULT_POLITENESS = {
+    'rate': 5.0,
+    'burst': 10,
+    'retries': 4,
+    'backoff': 1.0,
+    'backoff_max': 60.0,
+    'breaker_threshold': 5,
+    'breaker_cooldown': 30.0,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+PRIORITY_LATEST = 0
+PRIORITY_BACKFILL = 1
+SIZE_CLASS_LIMITS = (256 * 1024, 4 * 1024 * 1024)
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 256 * 1024
+PREALLOCATE_MIN = 1024 * 1024
+PART_CHECKPOINT = 4 * 1024 * 1024
+RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+DEFAULT_OPTIONS = {
+    'save_path': os.path.join(os.path.expanduser("~"), "Comics"),
+    'max_comics': 10,
+    'workers': DEFAULT_WORKERS,
+    'incremental': False,
+    'async_engine': False,
+}
+
+COMICS_CONFIG = {
+    "XKCD": {"url": "https://xkcd.com/", "rate": 8.0, "burst": 16},
+    "Dilbert": {"url": "https://dilbert.com/strip"},
+    "SMBC": {"url": "https://www.smbc-comics.com/"},
+    "The Oatmeal": {"url": "https://theoatmeal.com/"},
+    "Cyanide & Happiness": {"url": "https://explosm.net/comics/latest"}
+}
+
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid')
+PAGINATION_WORDS = ('next', 'prev', 'previous', 'older', 'newer')
+IMAGE_EXTENSIONS = {
+    'png': ('.png',),
+    'jpeg': ('.jpg', '.jpeg', '.jpe'),
+    'gif': ('.gif',),
+    'webp': ('.webp',),
+    'bmp': ('.bmp',),
+    'svg': ('.svg',),
+    'avif': ('.avif',),
+    'tiff': ('.tif', '.tiff'),
+    'ico': ('.ico',),
+}
+SKIPPED_LINK_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.css', '.js',
+                           '.pdf', '.zip', '.rar', '.cbz', '.mp3', '.mp4', '.xml', '.json'}
+
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+ZIP_END_RECORD = struct.Struct('<4s4H2LH')
+
+CachedPage = namedtuple('CachedPage', 'content derived not_modified')
+
+IMAGE_TAGS = {'name': 'img'}
+NAVIGATION_TAGS = {'name': ['img', 'a']}
+
+
+def load_tk():
+    global tk, ttk, messagebox, scrolledtext, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext, filedialog
+
+
+def load_aiohttp():
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp
+        except ImportError:
+            return False
+    return True
+
+
+class PrioritySlots:
+    def __init__(self, slots):
+        self.free = slots
+        self.waiting = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def hold(self, priority=PRIORITY_LATEST):
+        with self.condition:
+            ticket = (priority, next(self.order))
+            heapq.heappush(self.waiting, ticket)
+            while not self.free or self.waiting[0] != ticket:
+                self.condition.wait()
+            heapq.heappop(self.waiting)
+            self.free -= 1
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.free += 1
+                self.condition.notify_all()
+
+
+class AsyncPrioritySlots:
+    def __init__(self, slots):
+        self.free = slots
+        self.waiting = []
+        self.order = itertools.count()
+
+    @asynccontextmanager
+    async def hold(self, priority=PRIORITY_LATEST):
+        if self.free and not self.waiting:
+            self.free -= 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiting, (priority, next(self.order), waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if not waiter.cancelled():
+                    self.release()
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def release(self):
+        while self.waiting:
+            waiter = heapq.heappop(self.waiting)[2]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.free += 1
+
+
+class BandwidthBudget:
+    def __init__(self, bytes_per_second):
+        self.rate = float(bytes_per_second)
+        self.lock = threading.Lock()
+        self.burst = self.rate / 4
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.debt = {}
+
+    def _settle(self):
+        now = time.monotonic()
+        earned = (now - self.updated) * self.rate
+        self.updated = now
+        # Time that has passed pays off the most urgent transfers first.
+        for level in sorted(self.debt):
+            paid = min(earned, self.debt[level])
+            earned -= paid
+            self.debt[level] -= paid
+            if self.debt[level] < 1:
+                del self.debt[level]
+        self.tokens = min(self.burst, self.tokens + earned)
+
+    def _wait_time(self, priority):
+        ahead = sum(owed for level, owed in self.debt.items() if level <= priority)
+        return ahead / self.rate
+
+    def reserve(self, nbytes, priority=(PRIORITY_LATEST, 0)):
+        with self.lock:
+            self._settle()
+            granted = min(self.tokens, nbytes)
+            self.tokens -= granted
+            if nbytes > granted:
+                self.debt[priority] = self.debt.get(priority, 0.0) + nbytes - granted
+            return self._wait_time(priority)
+
+    def wait_time(self, priority=(PRIORITY_LATEST, 0)):
+        with self.lock:
+            self._settle()
+            return self._wait_time(priority)
+
+
+def size_class(expected):
+    if expected is None:
+        return 1
+    return sum(expected > limit for limit in SIZE_CLASS_LIMITS)
+
+
+def stream_chunk_size(expected, bandwidth=None):
+    # Large reads keep the per-chunk Python work (write, hash, stop check) off the hot
+    # path, small files still arrive in a handful of chunks.
+    size = DEFAULT_CHUNK_SIZE if expected is None else expected // 8
+    if bandwidth is not None:
+        size = min(size, int(bandwidth.burst))
+    return max(MIN_CHUNK_SIZE, min(size, MAX_CHUNK_SIZE))
+
+
+class HttpClient:
+    def __init__(self, pool_connections=10, pool_maxsize=16, timeout=10, headers=None,
+                 max_connections=16, max_per_host=6, metrics=None, politeness=None):
+        self.pool_maxsize = pool_maxsize
+        self.metrics = metrics
+        self.politeness = politeness
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.connection_slots = PrioritySlots(max_connections)
+        self.host_slots = {}
+        self.host_slots_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self.host_slots_lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = PrioritySlots(self.max_per_host)
+            return self.host_slots[host]
+
+    @contextmanager
+    def slot(self, url, priority=PRIORITY_LATEST):
+        with self._host_slot(url).hold(priority), self.connection_slots.hold(priority):
+            yield
+
+    def observe(self, url, source, queued, started, response, nbytes, error):
+        if self.metrics is None:
+            return
+        self.metrics.request(url, status=response.status_code if response is not None else None,
+                             nbytes=nbytes, seconds=time.monotonic() - started,
+                             ttfb=response.elapsed.total_seconds() if response is not None else None,
+                             wait=started - queued, error=type(error).__name__ if error else None,
+                             source=source)
+
+    def retry_delay(self, url, source, attempt, response, error):
+        if self.politeness is None:
+            return None
+        throttle = self.politeness.host(url, source)
+        if error is not None:
+            return self.politeness.retry_delay(throttle, attempt, url, error=type(error).__name__)
+        return self.politeness.retry_delay(
+            throttle, attempt, url, status=response.status_code,
+            retry_after=retry_after_seconds(response.headers.get('Retry-After')))
+
+    def attempts(self, url, source):
+        for attempt in itertools.count():
+            if self.politeness is not None:
+                self.politeness.wait(self.politeness.host(url, source).reserve())
+            yield attempt
+
+    def retry(self, url, source, delay):
+        if self.metrics is not None:
+            self.metrics.count(url, 'retries', source=source)
+        self.politeness.wait(delay)
+
+    def get(self, url, source=None, priority=PRIORITY_LATEST, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in self.attempts(url, source):
+            queued = time.monotonic()
+            with self.slot(url, priority):
+                started = time.monotonic()
+                response = error = None
+                try:
+                    response = self.session.get(url, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                except requests.exceptions.RequestException as e:
+                    self.observe(url, source, queued, started, None, 0, e)
+                    raise
+            self.observe(url, source, queued, started, response,
+                         len(response.content) if response is not None else 0, error)
+
+            delay = self.retry_delay(url, source, attempt, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            self.retry(url, source, delay)
+
+    @contextmanager
+    def stream(self, url, source=None, priority=PRIORITY_LATEST, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in self.attempts(url, source):
+            queued = time.monotonic()
+            with self.slot(url, priority):
+                started = time.monotonic()
+                response = error = None
+                try:
+                    response = self.session.get(url, stream=True, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                except requests.exceptions.RequestException as e:
+                    self.observe(url, source, queued, started, None, 0, e)
+                    raise
+
+                delay = self.retry_delay(url, source, attempt, response, error)
+                if delay is None and error is None:
+                    try:
+                        with response:
+                            yield response
+                    except Exception as e:
+                        error = e
+                        raise
+                    finally:
+                        self.observe(url, source, queued, started, response, response.raw.tell(), error)
+                    return
+
+                self.observe(url, source, queued, started, response, 0, error)
+                if response is not None:
+                    response.close()
+                if delay is None:
+                    raise error
+            self.retry(url, source, delay)
+
+    def close(self):
+        self.session.close()
+
+
+def parse_html(content, parse_only=None):
+    from bs4 import BeautifulSoup, SoupStrainer
+    return BeautifulSoup(content, HTML_PARSER,
+                         parse_only=SoupStrainer(**parse_only) if parse_only else None)
+
+
+def clean_image_url(img_url):
+    if img_url and img_url.startswith('//'):
+        return 'https:' + img_url
+    return img_url
+
+
+def xkcd_filename(comic_num, comic_data):
+    title = comic_data.get("safe_title", f"comic_{comic_num}")
+    clean_title = "".join(c if c.isalnum() or c in (
+        ' ', '_') else '' for c in title).strip().replace(' ', '_')
+    return f"xkcd_{comic_num:04d}_{clean_title}.png"
+
+
+def page_comic_id(page_url):
+    path_parts = urlparse(page_url).path.split('/')
+    return path_parts[-1] if path_parts[-1] else path_parts[-2]
+
+
+def find_dilbert_comic(soup, page_url, base_url):
+    comic_img = soup.find('img', class_='img-responsive img-comic')
+    if not comic_img:
+        comic_img = soup.find('img', class_='img-comic')
+
+    if not comic_img or not comic_img.get('src'):
+        return None, None, None
+
+    img_url = comic_img['src']
+
+    ext = os.path.splitext(urlparse(img_url).path)[1]
+    filename = f"dilbert_{page_comic_id(page_url)}{ext}"
+
+    prev_link_element = soup.find(
+        'a', class_='btn btn-lg btn-default btn-comic-navigation')
+    next_url = None
+
+    if not prev_link_element:
+        prev_link = soup.find('a', {'rel': 'prev'})
+        if prev_link:
+            next_url = urljoin(base_url, prev_link.get('href'))
+    else:
+        next_url = urljoin(base_url, prev_link_element.get('href'))
+
+    return img_url, filename, next_url
+
+
+def find_latest_comic(soup, img_id, prefix):
+    comic_img = soup.find('img', id=img_id)
+    if not comic_img or not comic_img.get('src'):
+        return None, None
+
+    img_url = clean_image_url(comic_img['src'])
+    ext = os.path.splitext(urlparse(img_url).path)[1]
+    return img_url, f"{prefix}_latest{ext}"
+
+
+def oatmeal_candidate(img_url, base_url):
+    if img_url and 'comics/' in img_url and any(ext in img_url.lower() for ext in ['.jpg', '.jpeg', '.png']):
+        full_img_url = urljoin(base_url, img_url)
+        url_path_segment = urlparse(full_img_url).path.split('/')[-1]
+        return full_img_url, f"oatmeal_{url_path_segment}"
+    return None
+
+
+def generic_candidate(img_url, base_url):
+    if img_url and any(ext in img_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif']) and 'icon' not in img_url.lower() and 'logo' not in img_url.lower():
+        return urljoin(base_url, img_url)
+    return None
+
+
+def find_oatmeal_images(soup, base_url):
+    for img in soup.find_all('img'):
+        candidate = oatmeal_candidate(img.get('src'), base_url)
+        if candidate:
+            yield candidate
+
+
+def find_generic_images(soup, base_url):
+    for img in soup.find_all('img'):
+        candidate = generic_candidate(img.get('src'), base_url)
+        if candidate:
+            yield candidate
+
+
+class ImageScanner(HTMLParser):
+    def __init__(self, encoding=None):
+        super().__init__()
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')
+        self.decoder = decoder(errors='replace')
+        self.found = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            for name, value in attrs:
+                if name == 'src' and value:
+                    self.found.append(value)
+
+    def scan(self, chunk, final=False):
+        self.feed(self.decoder.decode(chunk, final))
+        if final:
+            self.close()
+        found, self.found = self.found, []
+        return found
+
+
+def scan_image_urls(chunks, encoding=None):
+    scanner = ImageScanner(encoding)
+    for chunk in chunks:
+        yield from scanner.scan(chunk)
+    yield from scanner.scan(b'', final=True)
+
+
+def charset_from_headers(headers):
+    content_type = headers.get('Content-Type', '')
+    if 'charset=' in content_type:
+        return content_type.split('charset=')[-1].split(';')[0].strip().strip('"')
+    return None
+
+
+def generic_filename(position, img_url):
+    ext = os.path.splitext(urlparse(img_url).path)[1]
+    return f"comic_{position:03d}{ext}"
+
+
+def crawl_filename(img_url):
+    # Crawled pages finish in any order, so the name comes from the image URL, not its position.
+    stem, ext = os.path.splitext(os.path.basename(urlparse(img_url).path))
+    stem = ''.join(c if c.isalnum() or c in '-_' else '_' for c in stem)[:60] or 'image'
+    digest = hashlib.blake2b(normalize_url(img_url).encode('utf-8'), digest_size=4).hexdigest()
+    return f"{stem}_{digest}{ext}"
+
+
+def normalize_url(url):
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    query = ''
+    if parts.query:
+        query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                                 if not key.lower().startswith(TRACKING_PARAMS)))
+    return urlunparse((scheme, host, parts.path or '/', '', query, ''))
+
+
+def find_crawl_links(soup, page_url):
+    images = []
+    for img in soup.find_all('img'):
+        candidate = generic_candidate(img.get('src'), page_url)
+        if candidate:
+            images.append(candidate)
+
+    pagination, links = [], []
+    for link in soup.find_all('a', href=True):
+        href = urljoin(page_url, link['href'])
+        if urlparse(href).scheme not in ('http', 'https'):
+            continue
+        if os.path.splitext(urlparse(href).path)[1].lower() in SKIPPED_LINK_EXTENSIONS:
+            continue
+        rel = ' '.join(link.get('rel') or []).lower()
+        text = link.get_text(' ', strip=True).lower()
+        if any(word in rel or word in text.split() for word in PAGINATION_WORDS):
+            pagination.append(href)
+        else:
+            links.append(href)
+    return images, pagination + links
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        bits = max(1024, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.size = bits
+        self.hashes = max(1, round(bits / capacity * math.log(2)))
+        self.bits = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class CrawlFrontier:
+    # Visited pages and seen images sit behind a Bloom filter; only its rare positives
+    # (and every new URL) touch the on-disk set, so memory stays flat however big the site is.
+    def __init__(self, base_url, state_path, max_pages, max_depth):
+        self.site = urlparse(normalize_url(base_url)).netloc
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.queued = 0
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.pages = BloomFilter(max_pages)
+        self.images = BloomFilter(max_pages * 4)
+        self.path = state_path
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        self.conn = sqlite3.connect(state_path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=OFF")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("CREATE TABLE seen (kind TEXT NOT NULL, url TEXT NOT NULL, PRIMARY KEY (kind, url))")
+        self.push(base_url, 0)
+
+    def _first_sight(self, kind, bloom, url):
+        if url in bloom:
+            row = self.conn.execute("SELECT 1 FROM seen WHERE kind = ? AND url = ?", (kind, url)).fetchone()
+            if row is not None:
+                return False
+        bloom.add(url)
+        self.conn.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (kind, url))
+        return True
+
+    def push(self, url, depth):
+        url = normalize_url(url)
+        with self.lock:
+            if depth > self.max_depth or self.queued >= self.max_pages:
+                return False
+            if urlparse(url).netloc != self.site or not self._first_sight('page', self.pages, url):
+                return False
+            self.queued += 1
+            self.pending.append((url, depth))
+            return True
+
+    def pop(self):
+        with self.lock:
+            return self.pending.popleft() if self.pending else None
+
+    def new_image(self, img_url):
+        with self.lock:
+            return self._first_sight('image', self.images, normalize_url(img_url))
+
+    def close(self):
+        self.conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def comic_folder_name(comic_name):
+    return comic_name.replace(' & ', '_').replace(' ', '_')
+
+
+def shard_key(comic_id):
+    comic_id = str(comic_id)
+    if comic_id.isdigit():
+        return int(comic_id)
+    try:
+        return date.fromisoformat(comic_id).toordinal()
+    except ValueError:
+        return int.from_bytes(hashlib.blake2b(comic_id.encode(), digest_size=8).digest(), 'big')
+
+
+def describe_ids(comic_ids, limit=20):
+    spans = []
+    for comic_id in sorted(comic_ids, key=shard_key):
+        key = shard_key(comic_id)
+        if spans and key == spans[-1][2] + 1:
+            spans[-1][1:] = [comic_id, key]
+        else:
+            spans.append([comic_id, comic_id, key])
+    text = ", ".join(first if first == last else f"{first}..{last}" for first, last, _ in spans[:limit])
+    return text + (f", ... ({len(spans) - limit} more)" if len(spans) > limit else "")
+
+
+def jpeg_size(f):
+    # Walk the marker segments to the first start-of-frame; EXIF and ICC blocks
+    # in front of it can be far larger than any fixed-size header read.
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        while len(marker) == 2 and marker[0] == 0xFF and marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return 0, 0
+        code = marker[1]
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return 0, 0
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                return 0, 0
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        f.seek(struct.unpack('>H', length)[0] - 2, 1)
+
+
+def webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8X':
+        return 1 + int.from_bytes(head[24:27], 'little'), 1 + int.from_bytes(head[27:30], 'little')
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    return 0, 0
+
+
+def sniff_image(filepath):
+    # Returns (format, width, height, problem); problem is None for a usable image.
+    # End markers are looked for anywhere in the last SNIFF_WINDOW bytes, since padding or
+    # an appended trailer after them is harmless; short bodies are caught by Content-Length.
+    size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        head = f.read(SNIFF_WINDOW)
+        f.seek(max(0, size - SNIFF_WINDOW))
+        tail = f.read()
+        if head.startswith(b'\xff\xd8\xff'):
+            width, height = jpeg_size(f)
+
+    if not head:
+        return None, 0, 0, "empty file"
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and len(head) >= 24:
+        image_format, (width, height) = 'png', struct.unpack('>II', head[16:24])
+        complete = b'IEND\xaeB`\x82' in tail
+    elif head.startswith(b'\xff\xd8\xff'):
+        image_format, complete = 'jpeg', b'\xff\xd9' in tail
+    elif head[:6] in (b'GIF87a', b'GIF89a'):
+        image_format, (width, height) = 'gif', struct.unpack('<HH', head[6:10])
+        complete = b'\x00;' in tail
+    elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        image_format, (width, height) = 'webp', webp_size(head)
+        complete = size >= struct.unpack('<I', head[4:8])[0] + 8
+    elif head[:2] == b'BM' and len(head) >= 26:
+        image_format = 'bmp'
+        width, height = struct.unpack('<ii', head[18:26])
+        height = abs(height)
+        complete = size >= struct.unpack('<I', head[2:6])[0]
+    elif text.startswith((b'<!doctype html', b'<html')):
+        return None, 0, 0, "HTML page instead of an image"
+    elif b'<svg' in text:
+        return 'svg', 0, 0, None if b'</svg>' in tail.lower() else "truncated SVG"
+    elif b'<body' in text:
+        return None, 0, 0, "HTML page instead of an image"
+    elif text.startswith((b'<', b'{', b'[')):
+        return None, 0, 0, "text response instead of an image"
+    elif head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'avif', 0, 0, None
+    elif head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff', 0, 0, None
+    elif head[:4] == b'\x00\x00\x01\x00':
+        return 'ico', 0, 0, None
+    else:
+        # Anything else binary is left alone; the point is to catch error pages and cut-off bodies.
+        return None, 0, 0, None
+
+    if not complete:
+        return image_format, width, height, "truncated body"
+    if width <= 0 or height <= 0:
+        return image_format, width, height, f"invalid dimensions {width}x{height}"
+    return image_format, width, height, None
+
+
+def file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PartFile:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.path = filepath + '.part'
+        self.mark_path = self.path + '.len'
+        self.offset = self.recover() if os.path.exists(self.path) else 0
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.expected = None
+        self.file = None
+        self.preallocated = False
+        self.checkpoint = 0
+        self.write_seconds = 0.0
+
+    def recover(self):
+        # A preallocated .part is full length on disk; its .len mark says how much of it was written.
+        size = os.path.getsize(self.path)
+        if os.path.exists(self.mark_path):
+            try:
+                with open(self.mark_path) as f:
+                    size = min(size, int(f.read()))
+            except (OSError, ValueError):
+                size = 0
+            os.truncate(self.path, size)
+            os.remove(self.mark_path)
+        return size
+
+    def range_headers(self):
+        return {'Range': f"bytes={self.offset}-"} if self.offset else {}
+
+    def accepts(self, status, headers):
+        content_range = headers.get('Content-Range', '')
+        return not self.offset or not (
+            status == 416 or (status == 206 and not content_range.startswith(f"bytes {self.offset}-")))
+
+    def restart(self):
+        self.discard()
+        self.offset = 0
+
+    def open(self, status, headers):
+        if status == 416 or not self.accepts(status, headers):
+            self.discard()
+            raise IOError(f"server rejected the request for {os.path.basename(self.filepath)} (HTTP {status})")
+
+        resumed = status == 206
+        if resumed:
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    self.digest.update(chunk)
+            self.size = self.offset
+            total = headers.get('Content-Range', '').rpartition('/')[2]
+            self.expected = int(total) if total.isdigit() else None
+        else:
+            length = headers.get('Content-Length', '')
+            if length.isdigit() and headers.get('Content-Encoding', 'identity') == 'identity':
+                self.expected = int(length)
+
+        self.file = open(self.path, 'ab' if resumed else 'wb')
+        if not resumed and self.expected and self.expected >= PREALLOCATE_MIN:
+            self.preallocate()
+        return resumed
+
+    def preallocate(self):
+        if not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(self.file.fileno(), 0, self.expected)
+        except OSError:
+            return
+        self.preallocated = True
+        self.mark()
+
+    def mark(self):
+        self.file.flush()
+        with open(self.mark_path + '.tmp', 'w') as f:
+            f.write(str(self.size))
+        os.replace(self.mark_path + '.tmp', self.mark_path)
+        self.checkpoint = self.size
+
+    def write(self, chunk):
+        started = time.perf_counter()
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        if self.preallocated and self.size - self.checkpoint >= PART_CHECKPOINT:
+            self.mark()
+        self.write_seconds += time.perf_counter() - started
+
+    def close(self):
+        if self.file is not None:
+            if self.preallocated and self.size != self.expected:
+                self.file.truncate(self.size)
+            self.file.close()
+            self.file = None
+            if self.preallocated and os.path.exists(self.mark_path):
+                os.remove(self.mark_path)
+
+    def commit(self):
+        self.close()
+        if self.expected is not None and self.size != self.expected:
+            return False
+        os.replace(self.path, self.filepath)
+        return True
+
+    def discard(self):
+        self.close()
+        for path in (self.path, self.mark_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def sha256(self):
+        return self.digest.hexdigest()
+
+
+class ContentStore:
+    def __init__(self, root):
+        self.root = root
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def has(self, sha256):
+        return bool(sha256) and os.path.exists(self.blob_path(sha256))
+
+    def link(self, sha256, filepath):
+        blob = self.blob_path(sha256)
+        tmp_path = filepath + '.link'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(blob, tmp_path)
+        except OSError:
+            try:
+                os.symlink(os.path.relpath(blob, os.path.dirname(filepath)), tmp_path)
+            except OSError:
+                shutil.copy2(blob, tmp_path)
+        os.replace(tmp_path, filepath)
+
+    def ingest(self, filepath, sha256):
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, filepath):
+                self.link(sha256, filepath)
+            return
+
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp_path = blob + '.tmp'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            # On the same volume the new file simply becomes the blob; no bytes are written twice.
+            os.link(filepath, tmp_path)
+            os.replace(tmp_path, blob)
+        except OSError:
+            shutil.copy2(filepath, tmp_path)
+            os.replace(tmp_path, blob)
+            self.link(sha256, filepath)
+
+
+def salvage_zip(path):
+    # An interrupted run leaves complete stored entries but no usable central directory. Index
+    # what is there, cut off a half-written tail, and write a fresh directory after it.
+    entries = []
+    end = 0
+    with open(path, 'r+b') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        while len(entries) < 0xFFFF:
+            header = f.read(ZIP_LOCAL_HEADER.size)
+            if len(header) < ZIP_LOCAL_HEADER.size:
+                break
+            (signature, version, flags, method, mod_time, mod_date, crc,
+             compressed, size, name_length, extra_length) = ZIP_LOCAL_HEADER.unpack(header)
+            name = f.read(name_length)
+            data_end = end + ZIP_LOCAL_HEADER.size + name_length + extra_length + compressed
+            if (signature != b'PK\x03\x04' or method != zipfile.ZIP_STORED or not size or compressed != size
+                    or flags & 0x08 or len(name) < name_length or data_end > min(file_size, 0xFFFFFFFF)):
+                break
+            entries.append((end, name, version, flags, mod_time, mod_date, crc, size))
+            end = data_end
+            f.seek(end)
+
+        f.seek(end)
+        f.truncate()
+        for offset, name, version, flags, mod_time, mod_date, crc, size in entries:
+            f.write(ZIP_CENTRAL_HEADER.pack(b'PK\x01\x02', 20, version, flags, zipfile.ZIP_STORED,
+                                            mod_time, mod_date, crc, size, size, len(name),
+                                            0, 0, 0, 0, 0o644 << 16, offset))
+            f.write(name)
+        f.write(ZIP_END_RECORD.pack(b'PK\x05\x06', 0, 0, len(entries), len(entries),
+                                    f.tell() - end, end, 0))
+    return len(entries)
+
+
+def zip_directory_intact(path):
+    # Append mode writes new entries over the old central directory, so a crash can leave
+    # the old end record in place, pointing at entry data instead of a directory.
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 0xFFFF - ZIP_END_RECORD.size))
+        tail = f.read()
+        at = tail.rfind(b'PK\x05\x06')
+        if at < 0 or len(tail) - at < ZIP_END_RECORD.size:
+            return False
+        entries, directory_size, directory_offset = ZIP_END_RECORD.unpack_from(tail, at)[4:7]
+        if entries == 0xFFFF or directory_offset == 0xFFFFFFFF:
+            return zipfile.is_zipfile(path)
+        if directory_offset + directory_size != size - len(tail) + at:
+            return False
+        f.seek(directory_offset)
+        return not entries or f.read(4) == b'PK\x01\x02'
+
+
+class CbzArchive:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.salvaged = None
+        if os.path.exists(path) and not zip_directory_intact(path):
+            self.salvaged = salvage_zip(path)
+        # Append mode writes new entries over the old central directory and a new one on
+        # close, so earlier entries are never read or rewritten.
+        self.zip = zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_STORED)
+        self.names = set(self.zip.namelist())
+        self.added = 0
+
+    def add(self, filepath, arcname):
+        with self.lock:
+            if arcname in self.names:
+                return False
+            self.zip.write(filepath, arcname)
+            self.names.add(arcname)
+            self.added += 1
+            return True
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+
+
+class DownloadManifest:
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS comics (
+                source TEXT NOT NULL,
+                comic_id TEXT NOT NULL,
+                url TEXT,
+                path TEXT NOT NULL,
+                size INTEGER,
+                sha256 TEXT,
+                fetched_at TEXT,
+                PRIMARY KEY (source, comic_id))""")
+            self.conn.execute("DROP INDEX IF EXISTS comics_url")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS comics_any_url ON comics (url)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS comics_path ON comics (path)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS comics_sha256 ON comics (sha256)")
+            # What each URL last downloaded to, kept when a comic row moves to another path.
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS url_content (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                source TEXT PRIMARY KEY,
+                high_water TEXT NOT NULL,
+                updated_at TEXT)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS verified (
+                sha256 TEXT PRIMARY KEY,
+                format TEXT,
+                width INTEGER,
+                height INTEGER,
+                problem TEXT,
+                checked_at TEXT)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS archive_plan (
+                source TEXT NOT NULL,
+                comic_id TEXT NOT NULL,
+                PRIMARY KEY (source, comic_id))""")
+
+    def _entry(self, row):
+        if row is None:
+            return None
+        entry = dict(zip(('source', 'comic_id', 'url', 'path', 'size', 'sha256', 'fetched_at'), row))
+        entry['path'] = os.path.join(self.root, entry['path'])
+        return entry
+
+    def get(self, source, comic_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM comics WHERE source = ? AND comic_id = ?",
+                                    (source, str(comic_id))).fetchone()
+        return self._entry(row)
+
+    def find_any_url(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT sha256, size FROM url_content WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                row = self.conn.execute("SELECT sha256, size FROM comics WHERE url = ? AND sha256 IS NOT NULL",
+                                        (url,)).fetchone()
+        return None if row is None else {'sha256': row[0], 'size': row[1]}
+
+    def has_content(self, sha256):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM comics WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+    def find_path(self, filepath):
+        relpath = os.path.relpath(os.path.abspath(filepath), self.root)
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM comics WHERE path = ?",
+                                    (relpath,)).fetchone()
+        return self._entry(row)
+
+    def record(self, source, comic_id, url, filepath, size, sha256):
+        relpath = os.path.relpath(os.path.abspath(filepath), self.root)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM comics WHERE path = ? AND NOT (source = ? AND comic_id = ?)",
+                              (relpath, source, str(comic_id)))
+            self.conn.execute("INSERT OR REPLACE INTO comics VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (source, str(comic_id), url, relpath, size, sha256,
+                               datetime.now().isoformat(timespec='seconds')))
+            if url and sha256:
+                self.conn.execute("INSERT OR REPLACE INTO url_content VALUES (?, ?, ?)", (url, sha256, size))
+
+    def forget(self, source, comic_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM comics WHERE source = ? AND comic_id = ?", (source, str(comic_id)))
+
+    def verification(self, sha256):
+        with self.lock:
+            row = self.conn.execute("SELECT format, problem FROM verified WHERE sha256 = ?",
+                                    (sha256,)).fetchone()
+        return row
+
+    def record_verification(self, sha256, image_format, width, height, problem):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO verified VALUES (?, ?, ?, ?, ?, ?)",
+                              (sha256, image_format, width, height, problem,
+                               datetime.now().isoformat(timespec='seconds')))
+
+    def highest_id(self, source):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(CAST(comic_id AS INTEGER)) FROM comics WHERE source = ?",
+                                    (source,)).fetchone()
+        return row[0]
+
+    def get_mark(self, source):
+        with self.lock:
+            row = self.conn.execute("SELECT high_water FROM sync_state WHERE source = ?",
+                                    (source,)).fetchone()
+        return row[0] if row else None
+
+    def set_mark(self, source, high_water):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                              (source, str(high_water), datetime.now().isoformat(timespec='seconds')))
+
+    def plan_archive(self, source, comic_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO archive_plan VALUES (?, ?)",
+                                  [(source, str(comic_id)) for comic_id in comic_ids])
+
+    def planned(self):
+        with self.lock:
+            return set(self.conn.execute("SELECT source, comic_id FROM archive_plan"))
+
+    def rows(self):
+        with self.lock:
+            return self.conn.execute("SELECT * FROM comics").fetchall()
+
+    def import_rows(self, rows):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO comics VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def missing_numbers(self, source, first, last):
+        with self.lock:
+            known = {row[0] for row in self.conn.execute(
+                "SELECT CAST(comic_id AS INTEGER) FROM comics WHERE source = ? "
+                "AND CAST(comic_id AS INTEGER) BETWEEN ? AND ?", (source, first, last))}
+        return [num for num in range(first, last + 1) if num not in known]
+
+    def missing_dates(self, source, start, end):
+        with self.lock:
+            known = {row[0] for row in self.conn.execute(
+                "SELECT comic_id FROM comics WHERE source = ? AND comic_id BETWEEN ? AND ?",
+                (source, start.isoformat(), end.isoformat()))}
+        days = (end - start).days + 1
+        return [start + timedelta(days=offset) for offset in range(days)
+                if (start + timedelta(days=offset)).isoformat() not in known]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class WorkQueue:
+    # Only outstanding work lives here: an item is deleted once it has been attempted, so
+    # whatever is left after a crash or a stop is exactly what the next run has to resume.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS work (
+                source TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (source, kind, key))""")
+
+    def add(self, source, origin, kind, items, done=None):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO work VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(source, kind, str(key), origin, position, json.dumps(payload))
+                                   for key, position, payload in items])
+            if done is not None:
+                self.conn.execute("DELETE FROM work WHERE source = ? AND kind = ? AND key = ?",
+                                  (source, kind, str(done)))
+
+    def discard_stale(self, source, origin):
+        # Work planned against a different URL for this source can't be resumed.
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM work WHERE source = ? AND origin != ?", (source, origin))
+
+    def pending(self, source, kind):
+        with self.lock:
+            rows = self.conn.execute("SELECT key, position, payload FROM work WHERE source = ? AND kind = ? "
+                                     "ORDER BY position", (source, kind)).fetchall()
+        return [(key, position, json.loads(payload)) for key, position, payload in rows]
+
+    def done(self, source, kind, key):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM work WHERE source = ? AND kind = ? AND key = ?",
+                              (source, kind, str(key)))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ArchiveShard:
+    # IDs are dealt out by value rather than by position, so every shard agrees on the split
+    # even when the shards start on either side of a new comic being published.
+    def __init__(self, comic_name, index, count, id_range=None, ids=None):
+        self.comic_name = comic_name
+        self.index = index
+        self.count = count
+        self.id_range = id_range
+        self.ids = ids
+
+    @property
+    def label(self):
+        return f"{self.index}/{self.count}"
+
+    def state_file(self, filename):
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{comic_folder_name(self.comic_name)}.shard-{self.index}-of-{self.count}{ext}"
+
+    def owns(self, comic_id):
+        return shard_key(comic_id) % self.count == self.index - 1
+
+    def check(self):
+        comic_name = self.comic_name
+        if comic_name == "XKCD":
+            if self.ids is not None and not all(comic_id.isdigit() for comic_id in self.ids):
+                raise ValueError("XKCD: --ids must list comic numbers")
+            if self.id_range and not all(part.isdigit() for part in self.id_range if part):
+                raise ValueError("XKCD: --range must be comic numbers, e.g. 1:3000")
+        elif comic_name == "Dilbert":
+            if self.ids is None and not (self.id_range and all(self.id_range)):
+                raise ValueError("Dilbert: needs a --range of strip dates or an --ids file")
+            try:
+                self.dilbert_pages('')
+            except ValueError as e:
+                raise ValueError(f"Dilbert: {e}")
+        else:
+            raise ValueError(f"{comic_name}: only XKCD numbers and Dilbert dates can be archived in shards")
+
+    def xkcd_ids(self, latest_num):
+        if self.ids is not None:
+            numbers = [int(comic_id) for comic_id in self.ids]
+        else:
+            first, last = self.id_range or ('', '')
+            numbers = range(int(first or 1), min(int(last or latest_num), latest_num) + 1)
+        return sorted({num for num in numbers if num not in (0, 404) and self.owns(num)}, reverse=True)
+
+    def dilbert_pages(self, base_url):
+        strip_url = base_url.rstrip('/') + '/'
+        if self.ids is not None:
+            page_urls = [line if '://' in line else strip_url + date.fromisoformat(line).isoformat()
+                         for line in self.ids]
+        else:
+            first, last = (date.fromisoformat(day) for day in self.id_range)
+            page_urls = [strip_url + (first + timedelta(days=offset)).isoformat()
+                         for offset in range((last - first).days + 1)]
+        pages = {page_comic_id(page_url): page_url for page_url in page_urls}
+        return [pages[strip] for strip in sorted(pages, key=shard_key, reverse=True) if self.owns(strip)]
+
+
+class HttpCache:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                derived TEXT,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL)""")
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT etag, last_modified, body, derived FROM pages WHERE url = ?",
+                                    (url,)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'body': row[2],
+                'derived': json.loads(row[3]) if row[3] is not None else None}
+
+    def validators(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return entry, headers
+
+    def not_modified(self, url, entry):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE pages SET last_used = ? WHERE url = ?",
+                              (time.time(), url))
+        return CachedPage(entry['body'], entry['derived'], True)
+
+    def store(self, url, headers, body):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+
+        with self.lock, self.conn:
+            if not etag and not last_modified:
+                self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                return
+            self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                              (url, etag, last_modified, body, len(body), time.time()))
+            self._evict()
+
+    def store_derived(self, url, derived):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE pages SET derived = ? WHERE url = ?",
+                              (json.dumps(derived), url))
+
+    def _evict(self):
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self.conn.execute("SELECT url, size FROM pages ORDER BY last_used").fetchall():
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def prometheus_labels(**values):
+    pairs = []
+    for key, value in values.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def retry_after_seconds(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class SourceMap:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.urls = {}
+        self.hosts = {}
+
+    def add(self, source, base_url):
+        with self.lock:
+            self.urls[base_url] = source
+            self.hosts.setdefault(urlparse(base_url).netloc, source)
+
+    def lookup(self, url):
+        with self.lock:
+            prefixes = [base_url for base_url in self.urls if url.startswith(base_url)]
+            if prefixes:
+                return self.urls[max(prefixes, key=len)]
+            return self.hosts.get(urlparse(url).netloc)
+
+
+class HostThrottle:
+    def __init__(self, host, policy):
+        self.host = host
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.tokens = float(policy['burst'])
+        self.updated = time.monotonic()
+        self.failures = 0
+        self.paused_until = 0.0
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0.0, self.paused_until - now)
+            rate = self.policy['rate']
+            if rate:
+                self.tokens = min(float(self.policy['burst']),
+                                  self.tokens + (now - self.updated) * rate)
+                self.updated = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    delay = max(delay, -self.tokens / rate)
+            return delay
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.policy['breaker_threshold']:
+                return False
+            # Stay one failure away from tripping so a failed probe re-opens it at once.
+            self.failures = self.policy['breaker_threshold'] - 1
+            self.paused_until = time.monotonic() + self.policy['breaker_cooldown']
+            return True
+
+
+class Politeness:
+    def __init__(self, sources, stop_event, log):
+        self.sources = sources
+        self.stop_event = stop_event
+        self.log = log
+        self.lock = threading.Lock()
+        self.policies = {}
+        self.hosts = {}
+
+    def configure(self, source, config):
+        policy = dict(DEFAULT_POLITENESS)
+        policy.update({key: value for key, value in config.items() if key in DEFAULT_POLITENESS})
+        with self.lock:
+            self.policies[source] = policy
+
+    def host(self, url, source=None):
+        netloc = urlparse(url).netloc
+        with self.lock:
+            throttle = self.hosts.get(netloc)
+            if throttle is None:
+                policy = self.policies.get(source or self.sources.lookup(url), DEFAULT_POLITENESS)
+                throttle = self.hosts[netloc] = HostThrottle(netloc, policy)
+            return throttle
+
+    def wait(self, delay):
+        if delay > 0:
+            self.stop_event.wait(delay)
+
+    def retry_delay(self, throttle, attempt, url, status=None, retry_after=None, error=None):
+        if error is None and status not in RETRY_STATUSES:
+            throttle.succeeded()
+            return None
+
+        policy = throttle.policy
+        if throttle.failed():
+            self.log(f"⏸️ Pausing {throttle.host} for {policy['breaker_cooldown']:.0f}s "
+                     f"after {policy['breaker_threshold']} consecutive failures")
+        if attempt >= policy['retries']:
+            return None
+
+        if retry_after is not None:
+            throttle.pause(min(retry_after, policy['backoff_max']))
+            delay = 0.0
+        else:
+            delay = random.uniform(0, min(policy['backoff_max'], policy['backoff'] * 2 ** attempt))
+        self.log(f"⏳ Retrying {url} ({error or f'HTTP {status}'}), "
+                 f"attempt {attempt + 2}/{policy['retries'] + 1}")
+        return delay
+
+
+class RunMetrics:
+    COUNTERS = ('requests', 'errors', 'bytes', 'cache_hits', 'skipped', 'retries', 'seconds',
+                'ttfb_seconds', 'dns_seconds', 'connect_seconds', 'wait_seconds', 'write_seconds',
+                'throttle_seconds')
+
+    def __init__(self, engine='threads', sources=None):
+        self.engine = engine
+        self.sources = sources or SourceMap()
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.started = time.monotonic()
+        self.finished = None
+        self.planned = 0
+        self.completed = 0
+        self.bytes = 0
+        self.entries = {}
+
+    def plan(self, planned):
+        with self.lock:
+            self.planned += planned
+
+    def _entry(self, url, source):
+        host = urlparse(url).netloc
+        key = (source or self.sources.lookup(url) or 'unknown', host)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = dict.fromkeys(self.COUNTERS, 0)
+            entry.update(statuses={}, ttfb=[])
+        return entry
+
+    def request(self, url, status=None, nbytes=0, seconds=0.0, ttfb=None, dns=0.0, connect=0.0,
+                wait=0.0, error=None, source=None):
+        with self.lock:
+            entry = self._entry(url, source)
+            entry['requests'] += 1
+            entry['bytes'] += nbytes
+            entry['seconds'] += seconds
+            entry['dns_seconds'] += dns
+            entry['connect_seconds'] += connect
+            entry['wait_seconds'] += wait
+            if ttfb is not None:
+                entry['ttfb_seconds'] += ttfb
+                entry['ttfb'].append(ttfb)
+            if status == 304:
+                entry['cache_hits'] += 1
+            if error is not None or (status is not None and status >= 400 and status != 416):
+                entry['errors'] += 1
+            key = str(status) if status is not None else error or 'error'
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+            self.bytes += nbytes
+
+    def count(self, url, field, amount=1, source=None):
+        with self.lock:
+            self._entry(url, source)[field] += amount
+
+    def item_done(self):
+        with self.lock:
+            self.completed += 1
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def status_line(self):
+        elapsed = self.elapsed()
+        with self.lock:
+            completed, planned, total_bytes = self.completed, self.planned, self.bytes
+        rate = completed / elapsed if elapsed else 0.0
+        line = (f"{completed}/{planned} comics, {rate:.1f} comics/s, "
+                f"{total_bytes / elapsed / (1024 * 1024) if elapsed else 0.0:.2f} MB/s")
+        if rate and planned > completed:
+            line += f", ETA {timedelta(seconds=round((planned - completed) / rate))}"
+        return line
+
+    def summary(self):
+        elapsed = self.elapsed()
+        hosts = []
+        with self.lock:
+            for (source, host), entry in sorted(self.entries.items()):
+                ttfb = sorted(entry['ttfb'])
+                row = {'source': source, 'host': host,
+                       **{field: entry[field] for field in self.COUNTERS},
+                       'statuses': dict(entry['statuses'])}
+                if ttfb:
+                    row['ttfb_p50'] = ttfb[len(ttfb) // 2]
+                    row['ttfb_p95'] = ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.95))]
+                hosts.append(row)
+            totals = {'planned': self.planned, 'completed': self.completed, 'bytes': self.bytes}
+        return {'engine': self.engine,
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'elapsed_seconds': round(elapsed, 3),
+                **totals,
+                'comics_per_second': totals['completed'] / elapsed if elapsed else 0.0,
+                'bytes_per_second': totals['bytes'] / elapsed if elapsed else 0.0,
+                'hosts': hosts}
+
+    def prometheus(self):
+        summary = self.summary()
+        lines = []
+        for name, kind, value in (('comic_items_planned', 'gauge', summary['planned']),
+                                  ('comic_items_completed', 'gauge', summary['completed']),
+                                  ('comic_run_seconds', 'gauge', summary['elapsed_seconds'])):
+            lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+
+        lines.append("# TYPE comic_requests_total counter")
+        for row in summary['hosts']:
+            for status, count in row['statuses'].items():
+                lines.append(f"comic_requests_total"
+                             f"{prometheus_labels(source=row['source'], host=row['host'], status=status)} {count}")
+        for field in self.COUNTERS[1:]:
+            name = f"comic_{field}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{prometheus_labels(source=row['source'], host=row['host'])} {row[field]}"
+                      for row in summary['hosts']]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    def __init__(self, app, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?', 1)[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = app.metrics.prometheus().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class AsyncDownloadEngine:
+    def __init__(self, app, max_in_flight=256, max_per_host=32, timeout=10):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.session = None
+        self.loop = None
+        self.executor = None
+
+    def log_message(self, message):
+        self.app.log_message(message)
+
+    def run(self, jobs, on_source_done=None):
+        # The loop and session outlive a run so repeated runs reuse warm connections.
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        # Leaving the with block waits for offloaded manifest writes before the app closes it.
+        with ThreadPoolExecutor(thread_name_prefix='offload') as self.executor:
+            return self.loop.run_until_complete(self._run(jobs, on_source_done))
+
+    async def offload(self, func, *args):
+        # Parsing, SQLite writes and store copies would otherwise stall every transfer on the loop.
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def close(self):
+        if self.loop is None:
+            return
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+            self.session = None
+        self.loop.close()
+        self.loop = None
+
+    async def _run(self, jobs, on_source_done):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_in_flight, limit_per_host=self.max_per_host)
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.timeout, sock_read=self.timeout)
+            self.session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS, timeout=timeout,
+                                                 trace_configs=[self.trace_config()])
+
+        self.slots = AsyncPrioritySlots(self.max_in_flight)
+        tasks = [asyncio.create_task(self._download_source(comic_name, base_url, on_source_done))
+                 for comic_name, base_url in jobs]
+        watcher = asyncio.create_task(self._watch_stop(tasks))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+        # Image tasks orphaned by a cancelled source would otherwise linger in the reused loop.
+        leftovers = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in leftovers:
+            task.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return [0 if isinstance(result, BaseException) else result for result in results]
+
+    async def _watch_stop(self, tasks):
+        while not self.app.stop_event.is_set():
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+
+    async def _download_source(self, comic_name, base_url, on_source_done):
+        display_name = self.app.begin_source(comic_name, base_url)
+        success_count = 0
+        try:
+            success_count = await self.download_single_comic(comic_name, base_url)
+        finally:
+            self.app.end_source(display_name, success_count)
+            if on_source_done:
+                on_source_done()
+        return success_count
+
+    async def download_single_comic(self, comic_name, base_url):
+        max_downloads = self.app.get_max_downloads(comic_name)
+
+        comic_folder = os.path.join(
+            self.app.get_save_path(), comic_folder_name(comic_name))
+        os.makedirs(comic_folder, exist_ok=True)
+        self.app.open_work(comic_folder, base_url)
+
+        if comic_name == "XKCD":
+            return await self.download_xkcd(comic_folder, base_url, max_downloads)
+        elif comic_name == "Dilbert":
+            return await self.download_dilbert(comic_folder, base_url, max_downloads)
+        elif comic_name == "SMBC":
+            return await self.download_latest(comic_folder, base_url, 'cc-comic', 'smbc', "SMBC")
+        elif comic_name == "The Oatmeal":
+            return await self.download_oatmeal(comic_folder, base_url, max_downloads)
+        elif comic_name == "Cyanide & Happiness":
+            return await self.download_latest(comic_folder, base_url, 'main-comic', 'cyanide',
+                                              "Cyanide & Happiness")
+        else:
+            return await self.download_generic(comic_folder, base_url, max_downloads)
+
+    def trace_config(self):
+        loop = asyncio.get_running_loop()
+        trace = aiohttp.TraceConfig()
+
+        def mark(name):
+            async def callback(session, context, params):
+                if context.trace_request_ctx is not None:
+                    context.trace_request_ctx[name] = loop.time()
+            return callback
+
+        for hook, name in ((trace.on_request_start, 'start'),
+                           (trace.on_connection_queued_start, 'queued_start'),
+                           (trace.on_connection_queued_end, 'queued_end'),
+                           (trace.on_dns_resolvehost_start, 'dns_start'),
+                           (trace.on_dns_resolvehost_end, 'dns_end'),
+                           (trace.on_connection_create_start, 'connect_start'),
+                           (trace.on_connection_create_end, 'connect_end'),
+                           (trace.on_request_end, 'headers')):
+            hook.append(mark(name))
+        return trace
+
+    def observe(self, url, source, timing, started, response, error):
+        wait = timing.get('queued_end', 0.0) - timing.get('queued_start', 0.0)
+        dns = timing.get('dns_end', 0.0) - timing.get('dns_start', 0.0)
+        connect = timing.get('connect_end', 0.0) - timing.get('connect_start', 0.0) - dns
+        self.app.metrics.request(
+            url, status=response.status if response is not None else None,
+            nbytes=response.content.total_bytes if response is not None else 0,
+            seconds=asyncio.get_running_loop().time() - started - wait,
+            ttfb=timing['headers'] - timing['start'] - wait if 'headers' in timing else None,
+            dns=dns, connect=connect, wait=wait,
+            error=type(error).__name__ if error else None, source=source)
+
+    @asynccontextmanager
+    async def request(self, url, source=None, priority=PRIORITY_LATEST, **kwargs):
+        politeness = self.app.politeness
+        throttle = politeness.host(url, source)
+        for attempt in itertools.count():
+            await asyncio.sleep(throttle.reserve())
+            async with self.slots.hold(priority):
+                timing = {}
+                started = asyncio.get_running_loop().time()
+                response = error = None
+                try:
+                    response = await self.session.get(url, trace_request_ctx=timing, **kwargs)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+                except BaseException as e:
+                    self.observe(url, source, timing, started, None, e)
+                    raise
+
+                if error is not None:
+                    delay = politeness.retry_delay(throttle, attempt, url, error=type(error).__name__)
+                else:
+                    delay = politeness.retry_delay(
+                        throttle, attempt, url, status=response.status,
+                        retry_after=retry_after_seconds(response.headers.get('Retry-After')))
+
+                if delay is None and error is None:
+                    try:
+                        async with response:
+                            yield response
+                    except BaseException as e:
+                        error = e
+                        raise
+                    finally:
+                        self.observe(url, source, timing, started, response, error)
+                    return
+
+                self.observe(url, source, timing, started, response, error)
+                if response is not None:
+                    response.release()
+                if delay is None:
+                    raise error
+            self.app.metrics.count(url, 'retries', source=source)
+            await asyncio.sleep(delay)
+
+    async def throttle_bandwidth(self, url, source, nbytes, priority):
+        budget = self.app.bandwidth
+        if budget is None:
+            return
+        delay = budget.reserve(nbytes, priority)
+        if not delay:
+            return
+        started = time.monotonic()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = budget.wait_time(priority)
+        self.app.metrics.count(url, 'throttle_seconds', time.monotonic() - started, source=source)
+
+    async def _get(self, url, priority=PRIORITY_LATEST):
+        async with self.request(url, priority=priority) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def _fetch_page(self, url):
+        cache = self.app.http_cache
+        if cache is None:
+            return CachedPage(await self._get(url), None, False)
+
+        entry, headers = cache.validators(url)
+        async with self.request(url, headers=headers) as response:
+            if response.status == 304 and entry:
+                return cache.not_modified(url, entry)
+            response.raise_for_status()
+            content = await response.read()
+            cache.store(url, response.headers, content)
+            return CachedPage(content, None, False)
+
+    async def _extract_page(self, url, extractor, parse_only=None):
+        page = await self._fetch_page(url)
+        return await self.offload(self.app.parse_page, url, page, extractor, parse_only)
+
+    async def _download_image(self, img_url, filepath, filename, referer=None, comic_id=None, position=1):
+        try:
+            saved = await self._fetch_image(img_url, filepath, filename, referer, comic_id, position)
+            if saved:
+                self.app.verify_image(filepath)
+            self.app.settle_work(os.path.dirname(filepath), 'image', img_url, saved)
+            return saved
+        finally:
+            self.app.item_done()
+
+    async def _fetch_image(self, img_url, filepath, filename, referer, comic_id, position):
+        if not img_url:
+            return False
+
+        img_url = clean_image_url(img_url)
+        source = os.path.basename(os.path.dirname(filepath))
+        comic_id = comic_id or img_url
+
+        if await self.offload(self.app.skip_existing, source, comic_id, img_url, filepath, filename):
+            self.app.metrics.count(img_url, 'skipped', source=source)
+            return True
+
+        part = PartFile(filepath)
+        try:
+            rank = self.app.item_priority(position)
+            while True:
+                headers = part.range_headers()
+                if referer:
+                    headers['Referer'] = referer
+                async with self.request(img_url, source=source, priority=rank, headers=headers) as img_response:
+                    if img_response.status != 416:
+                        img_response.raise_for_status()
+                    if not part.accepts(img_response.status, img_response.headers):
+                        self.log_message(f"🔄 Server rejected resume of {filename} at byte {part.offset}, restarting")
+                        part.restart()
+                        continue
+                    resumed = part.open(img_response.status, img_response.headers)
+
+                    priority = (rank, size_class(part.expected))
+                    chunk_size = stream_chunk_size(part.expected, self.app.bandwidth)
+                    async for chunk in img_response.content.iter_chunked(chunk_size):
+                        part.write(chunk)
+                        await self.throttle_bandwidth(img_url, source, len(chunk), priority)
+                break
+
+            if not part.commit():
+                self.log_message(
+                    f"❌ Incomplete download: {filename} ({part.size}/{part.expected} bytes), will resume next run")
+                return False
+
+            await self.offload(self.app.record_download, source, comic_id, img_url,
+                               filepath, part.size, part.sha256())
+            self.log_message(
+                f"✅ Downloaded: {filename}" + (f" (resumed at {part.offset} bytes)" if resumed else ""))
+            return True
+        except asyncio.CancelledError:
+            part.close()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            part.close()
+            self.log_message(f"❌ Failed to download image {img_url}: {e}")
+            return False
+        except Exception as e:
+            part.close()
+            self.log_message(f"❌ File operation error for {filename}: {e}")
+            return False
+        finally:
+            self.app.metrics.count(img_url, 'write_seconds', part.write_seconds, source=source)
+
+    async def _download_xkcd_comic(self, folder, base_url, comic_num, position):
+        known = self.app.known_comic("XKCD", comic_num)
+        if known:
+            self.app.skipped_known(known)
+            return True
+
+        try:
+            comic_data = json.loads(await self._get(urljoin(base_url, f"{comic_num}/info.0.json"),
+                                                    self.app.item_priority(position)))
+            filename = xkcd_filename(comic_num, comic_data)
+            filepath = os.path.join(folder, filename)
+
+            return await self._download_image(comic_data.get("img"), filepath, filename,
+                                              comic_id=comic_num, position=position)
+
+        except aiohttp.ClientResponseError as e:
+            self.log_message(
+                f"⚠️ XKCD #{comic_num} not found or failed (HTTP Error: {e.status})")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.log_message(
+                f"❌ Failed to download XKCD #{comic_num}: {str(e)}")
+        return False
+
+    async def download_xkcd(self, folder, base_url, max_downloads):
+        latest_num, comic_nums = self.app.resumed_xkcd(folder)
+        if not comic_nums:
+            try:
+                latest_num = json.loads((await self._fetch_page(urljoin(base_url, "info.0.json"))).content)["num"]
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+                self.log_message(
+                    f"❌ XKCD download failed (Initial check): {str(e)}")
+                return 0
+            comic_nums = self.app.plan_xkcd(folder, latest_num, max_downloads)
+
+        async def download(comic_num, position):
+            saved = await self._download_xkcd_comic(folder, base_url, comic_num, position)
+            self.app.settle_work(folder, 'xkcd', comic_num, saved)
+            return saved
+
+        results = await asyncio.gather(*(download(comic_num, position)
+                                         for position, comic_num in enumerate(comic_nums, start=1)))
+        self.app.finish_xkcd_sync(latest_num, comic_nums)
+        return sum(results)
+
+    async def download_dilbert(self, folder, base_url, max_downloads):
+        def extractor(soup, page_url):
+            return find_dilbert_comic(soup, page_url, base_url)
+
+        if self.app.shard is not None:
+            return await self.download_strips("Dilbert", folder, self.app.plan_strips("Dilbert", folder, base_url),
+                                              extractor, NAVIGATION_TAGS)
+        return await self.crawl_sequential("Dilbert", folder, base_url, max_downloads, extractor,
+                                           NAVIGATION_TAGS)
+
+    async def _download_strip(self, source, folder, page_url, extractor, parse_only, position):
+        known = self.app.known_comic(source, page_comic_id(page_url))
+        if known:
+            self.app.skipped_known(known)
+            return True
+
+        try:
+            img_url, filename, _ = await self._extract_page(
+                page_url, lambda soup: extractor(soup, page_url), parse_only)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log_message(f"❌ {source} download failed on {page_url}: {str(e)}")
+            return False
+        if not img_url:
+            self.log_message(f"⚠️ {source}: Could not find comic image on {page_url}")
+            return False
+        return await self._download_image(img_url, os.path.join(folder, filename), filename, referer=page_url,
+                                          comic_id=page_comic_id(page_url), position=position)
+
+    async def download_strips(self, source, folder, page_urls, extractor, parse_only=None):
+        async def download(page_url, position):
+            saved = await self._download_strip(source, folder, page_url, extractor, parse_only, position)
+            self.app.settle_work(folder, 'strip', page_url, saved)
+            return saved
+
+        return sum(await asyncio.gather(*(download(page_url, position)
+                                          for position, page_url in enumerate(page_urls, start=1))))
+
+    async def crawl_sequential(self, source, folder, base_url, max_pages, extractor, parse_only=None):
+        resumed = self.resumed_images(folder)
+        current_url, first_position, max_pages = self.app.crawl_start(folder, base_url, max_pages, bool(resumed))
+        lookahead = max(1, self.app.settings['crawl_lookahead'])
+        pending = {asyncio.create_task(job) for job in resumed}
+        downloaded = 0
+
+        try:
+            for position in range(first_position, max_pages + 1):
+                if current_url is None:
+                    break
+                if self.app.reached_known_strip(source, current_url, base_url):
+                    self.app.advance_crawl(folder, current_url)
+                    break
+
+                img_url, filename, next_url = await self._extract_page(
+                    current_url, lambda soup: extractor(soup, current_url), parse_only)
+                if not img_url:
+                    self.log_message(
+                        f"⚠️ {source}: Could not find comic image on {current_url}")
+                    self.app.advance_crawl(folder, current_url)
+                    break
+
+                pending.add(asyncio.create_task(self.queued_image(
+                    folder, img_url, filename, position, referer=current_url,
+                    comic_id=page_comic_id(current_url))))
+                while len(pending) > lookahead:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    downloaded += sum(task.result() for task in done)
+
+                if not next_url or next_url == current_url:
+                    self.log_message(
+                        "ℹ️ Reached the oldest comic accessible or navigation failed.")
+                    self.app.advance_crawl(folder, current_url)
+                    break
+
+                self.app.advance_crawl(folder, current_url, next_url, position, max_pages)
+                current_url = next_url
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log_message(
+                f"❌ {source} download failed on {current_url}: {str(e)}")
+
+        return downloaded + sum(await asyncio.gather(*pending))
+
+    async def download_latest(self, folder, base_url, img_id, prefix, display_name):
+        try:
+            img_url, filename = await self._extract_page(
+                base_url, lambda soup: find_latest_comic(soup, img_id, prefix),
+                {'name': 'img', 'id': img_id})
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log_message(f"❌ {display_name} download failed: {str(e)}")
+            return 0
+        if img_url and await self._download_image(img_url, os.path.join(folder, filename), filename):
+            return 1
+
+        self.log_message(
+            f"⚠️ {display_name}: Could not find the comic image on the main page.")
+        return 0
+
+    async def _scan_image_urls(self, response):
+        scanner = ImageScanner(charset_from_headers(response.headers))
+        async for chunk in response.content.iter_chunked(16384):
+            for img_url in scanner.scan(chunk):
+                yield img_url
+        for img_url in scanner.scan(b'', final=True):
+            yield img_url
+
+    async def stream_page_images(self, page_url, candidate, max_downloads, download):
+        tasks = []
+        try:
+            async with self.request(page_url) as response:
+                response.raise_for_status()
+                async for img_url in self._scan_image_urls(response):
+                    item = candidate(img_url)
+                    if item:
+                        tasks.append(asyncio.create_task(
+                            download(item, len(tasks) + 1)))
+                        if len(tasks) >= max_downloads:
+                            break
+        finally:
+            results = await asyncio.gather(*tasks)
+        return sum(results)
+
+    def queued_image(self, folder, img_url, filename, position, referer=None, comic_id=None, resumed=False):
+        if not resumed:
+            self.app.plan_image(folder, img_url, filename, position, referer, comic_id)
+        return self._download_image(img_url, os.path.join(folder, filename), filename,
+                                    referer=referer, comic_id=comic_id, position=position)
+
+    def resumed_images(self, folder):
+        return [self.queued_image(folder, img_url, image['filename'], position, image['referer'],
+                                  image['comic_id'], resumed=True)
+                for img_url, position, image in self.app.resumed_work(folder, 'image')]
+
+    async def download_page_images(self, page_url, extractor, candidate, max_downloads, download):
+        if self.app.settings['stream_html']:
+            return await self.stream_page_images(page_url, candidate, max_downloads, download)
+
+        candidates = await self._extract_page(page_url, extractor, IMAGE_TAGS)
+        return sum(await asyncio.gather(*(download(item, position) for position, item
+                                          in enumerate(candidates[:max_downloads], start=1))))
+
+    async def download_oatmeal(self, folder, base_url, max_downloads):
+        def download(item, position):
+            img_url, filename = item
+            return self._download_image(img_url, os.path.join(folder, filename), filename,
+                                        referer=base_url, position=position)
+
+        try:
+            downloaded = await self.download_page_images(
+                base_url, lambda soup: list(find_oatmeal_images(soup, base_url)),
+                lambda img_url: oatmeal_candidate(img_url, base_url), max_downloads, download)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log_message(f"❌ The Oatmeal download failed: {str(e)}")
+            return 0
+
+        if downloaded == 0:
+            self.log_message(
+                "⚠️ The Oatmeal: Could not find reliable comic image links on the main page.")
+        return downloaded
+
+    async def crawl_page(self, page_url):
+        page = await self._fetch_page(page_url)
+        return await self.offload(lambda: find_crawl_links(parse_html(page.content, NAVIGATION_TAGS), page_url))
+
+    async def crawl_generic(self, folder, base_url, max_downloads):
+        frontier = CrawlFrontier(base_url, os.path.join(folder, CRAWL_STATE_FILE),
+                                 self.app.settings['crawl_pages'], self.app.settings['crawl_depth'])
+        workers = self.app.get_worker_count()
+        source = os.path.basename(folder)
+        fetching = {}
+        tasks = []
+        known = visited = 0
+        try:
+            while len(tasks) + known < max_downloads:
+                while len(fetching) < workers:
+                    item = frontier.pop()
+                    if item is None:
+                        break
+                    fetching[asyncio.create_task(self.crawl_page(item[0]))] = item
+                if not fetching:
+                    break
+
+                done, _ = await asyncio.wait(fetching, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page_url, depth = fetching.pop(task)
+                    try:
+                        img_urls, links = task.result()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        self.log_message(f"⚠️ Generic crawl: skipped {page_url}: {e}")
+                        continue
+                    visited += 1
+                    for img_url in img_urls:
+                        if len(tasks) + known < max_downloads and frontier.new_image(img_url):
+                            entry = self.app.known_comic(source, img_url)
+                            if entry:
+                                self.app.skipped_known(entry)
+                                known += 1
+                                continue
+                            tasks.append(asyncio.create_task(self.queued_image(
+                                folder, img_url, crawl_filename(img_url), len(tasks) + known + 1,
+                                referer=page_url)))
+                    for link in links:
+                        frontier.push(link, depth + 1)
+        finally:
+            for task in fetching:
+                task.cancel()
+            await asyncio.gather(*fetching, return_exceptions=True)
+            results = await asyncio.gather(*tasks)
+            frontier.close()
+
+        self.log_message(f"ℹ️ Generic crawl: visited {visited} of {frontier.queued} queued pages.")
+        return known + sum(results)
+
+    async def download_generic(self, folder, base_url, max_downloads):
+        resumed = self.resumed_images(folder)
+        if resumed:
+            return sum(await asyncio.gather(*resumed))
+
+        if self.app.settings['crawl_pages']:
+            downloaded = await self.crawl_generic(folder, base_url, max_downloads)
+            if downloaded == 0:
+                self.log_message("⚠️ Generic Scraper: Found no relevant images to download.")
+            return downloaded
+
+        def download(img_url, position):
+            filename = generic_filename(position, img_url)
+            return self._download_image(img_url, os.path.join(folder, filename), filename,
+                                        referer=base_url, position=position)
+
+        try:
+            downloaded = await self.download_page_images(
+                base_url, lambda soup: list(find_generic_images(soup, base_url)),
+                lambda img_url: generic_candidate(img_url, base_url), max_downloads, download)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log_message(f"❌ Generic download failed: {str(e)}")
+            return 0
+
+        if downloaded == 0:
+            self.log_message(
+                "⚠️ Generic Scraper: Found no relevant images to download.")
+        return downloaded
+
+
+def read_config(path=CONFIG_FILE):
+    with open(path, 'r') as f:
+        saved_config = json.load(f)
+    options = {key: saved_config[key] for key in ('save_path', 'max_comics', 'workers', 'incremental')
+               if key in saved_config}
+    if 'engine' in saved_config:
+        options['async_engine'] = saved_config['engine'] == 'asyncio'
+    settings = {key: value for key, value in saved_config.items() if key in DEFAULT_SETTINGS}
+    return options, settings
+
+
+class ComicDownloader:
+    keep_engine = False
+
+    def __init__(self, save_path=None, settings=None, **options):
+        self.comics_config = dict(COMICS_CONFIG)
+        self.stop_event = threading.Event()
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options)
+        if save_path:
+            self.options['save_path'] = save_path
+        self.http = None
+        self.manifest = None
+        self.work_queue = None
+        self.work_origins = {}
+        self.http_cache = None
+        self.content_store = None
+        self.sources = SourceMap()
+        self.politeness = Politeness(self.sources, self.stop_event, self.log_message)
+        self.metrics = RunMetrics(sources=self.sources)
+        self.metrics_server = None
+        self.async_engine = None
+        self.shard = None
+        self.bandwidth = None
+        self.archives = {}
+        self.archives_lock = threading.Lock()
+        self.verifier = None
+        self.requeued = []
+        self.blocked_renames = []
+        self.status_refreshed = 0.0
+
+    def get_option(self, name):
+        return self.options[name]
+
+    def get_save_path(self):
+        return self.get_option('save_path')
+
+    def state_path(self, filename):
+        # Shards keep their own state files so processes sharing a save path never
+        # write to the same SQLite database.
+        if self.shard is not None:
+            filename = self.shard.state_file(filename)
+        return os.path.join(self.get_save_path(), filename)
+
+    def log_message(self, message):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {message}", flush=True)
+
+    def set_status(self, text):
+        pass
+
+    def set_progress(self, value, maximum=None):
+        pass
+
+    def notify(self, title, message, error=False):
+        pass
+
+    def download_finished(self):
+        pass
+
+    def save_config(self):
+        pass
+
+    def stop_download(self):
+        self.log_message("⚠️ Stopping download process...")
+        self.stop_event.set()
+
+    def begin_source(self, comic_name, base_url):
+        display_name = "Custom Comic" if comic_name == "Custom_Comic" else comic_name
+        source = comic_folder_name(comic_name)
+        self.sources.add(source, base_url)
+        self.politeness.configure(source, self.comic_config(comic_name))
+        self.metrics.plan(1 if comic_name in ("SMBC", "Cyanide & Happiness") else self.get_max_downloads(comic_name))
+        with self.active_sources_lock:
+            self.active_sources.append(display_name)
+        self.refresh_status(force=True)
+        self.log_message(f"=== Starting {display_name} Download ===")
+        return display_name
+
+    def refresh_status(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.status_refreshed < STATUS_REFRESH_S:
+            return
+        self.status_refreshed = now
+        with self.active_sources_lock:
+            active = ', '.join(self.active_sources)
+        self.set_status(f"Downloading {active}... {self.metrics.status_line()}")
+
+    def item_done(self):
+        self.metrics.item_done()
+        self.refresh_status()
+
+    def end_source(self, display_name, success_count):
+        with self.active_sources_lock:
+            self.active_sources.remove(display_name)
+
+        if success_count > 0:
+            self.log_message(
+                f"🎉 {display_name} finished. Downloaded {success_count} comics.")
+
+    def advance_progress(self):
+        with self.active_sources_lock:
+            self.sources_done += 1
+            self.set_progress(self.sources_done)
+
+    def download_source(self, comic_name, base_url):
+        display_name = self.begin_source(comic_name, base_url)
+        success_count = 0
+        try:
+            success_count = self.download_single_comic(comic_name, base_url)
+        finally:
+            self.end_source(display_name, success_count)
+        return success_count
+
+    def use_async_engine(self):
+        if not self.get_option('async_engine'):
+            return False
+        if not load_aiohttp():
+            self.log_message(
+                "⚠️ aiohttp is not installed. Falling back to the threaded engine.")
+            return False
+        return True
+
+    def create_async_engine(self):
+        return AsyncDownloadEngine(self, max_in_flight=self.settings['async_max_in_flight'],
+                                   max_per_host=self.settings['async_max_per_host'],
+                                   timeout=self.settings['timeout'])
+
+    def ensure_async_engine(self):
+        if self.async_engine is None:
+            self.async_engine = self.create_async_engine()
+        return self.async_engine
+
+    def close(self):
+        if self.async_engine is not None:
+            self.async_engine.close()
+            self.async_engine = None
+        for resource in (self.http, self.manifest, self.work_queue, self.http_cache, self.metrics_server):
+            if resource is not None:
+                resource.close()
+        self.http = self.manifest = self.work_queue = self.http_cache = self.metrics_server = None
+
+    def comic_config(self, comic_name):
+        config = dict(self.comics_config.get(comic_name, {}))
+        config.update(self.settings['comics'].get(comic_name, {}))
+        if self.shard is not None:
+            # Shards split the site's request rate between them.
+            config['rate'] = config.get('rate', DEFAULT_POLITENESS['rate']) / self.shard.count
+        return config
+
+    def comic_url(self, comic_name):
+        return self.comic_config(comic_name)['url']
+
+    def download_comics(self, selected_comics, custom_url=''):
+        downloaded_count = 0
+        metrics = None
+
+        try:
+            jobs = [(comic_name, self.comic_url(comic_name))
+                    for comic_name in selected_comics]
+            if custom_url:
+                jobs.append(("Custom_Comic", custom_url))
+            total_comics = len(jobs)
+
+            if total_comics == 0:
+                self.log_message("No comics selected. Download finished.")
+                return
+
+            self.set_progress(0, maximum=total_comics)
+
+            os.makedirs(self.get_save_path(), exist_ok=True)
+            self.save_config()
+            self.ensure_manifest()
+            self.ensure_work_queue()
+            self.ensure_http_cache()
+            if self.settings['verify_images']:
+                self.verifier = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix='verify')
+
+            self.active_sources = []
+            self.active_sources_lock = threading.Lock()
+            self.sources_done = 0
+            use_async = self.use_async_engine()
+            metrics = self.metrics = RunMetrics(engine='asyncio' if use_async else 'threads',
+                                                sources=self.sources)
+            bandwidth_kb = self.settings['max_bandwidth_kb']
+            self.bandwidth = BandwidthBudget(bandwidth_kb * 1024) if bandwidth_kb else None
+            self.ensure_metrics_server()
+
+            if use_async:
+                engine = self.ensure_async_engine()
+                results = engine.run(jobs, on_source_done=self.advance_progress)
+            else:
+                self.ensure_http_client()
+                results = []
+                with ThreadPoolExecutor(max_workers=total_comics) as executor:
+                    futures = [executor.submit(self.download_source, comic_name, base_url)
+                               for comic_name, base_url in jobs]
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        self.advance_progress()
+
+            downloaded_count = sum(
+                1 for success_count in results if success_count > 0)
+
+            if not self.stop_event.is_set():
+                final_message = f"Download complete! {downloaded_count} sources processed."
+                self.set_status(final_message)
+                self.log_message(
+                    f"=== Finished! {downloaded_count} sources successfully processed ===")
+                self.notify("Complete", final_message)
+            else:
+                self.set_status("Download stopped by user.")
+                self.log_message("Download process halted by user.")
+
+        except Exception as e:
+            self.log_message(f"❌ Critical Error during download: {str(e)}")
+            self.notify("Error", f"A critical error occurred: {str(e)}", error=True)
+        finally:
+            if self.async_engine is not None and not self.keep_engine:
+                self.async_engine.close()
+                self.async_engine = None
+            self.finish_verification()
+            self.close_archives()
+            if metrics is not None:
+                self.finish_metrics(metrics)
+            self.download_finished()
+            self.stop_event.clear()
+
+    def verify_image(self, filepath):
+        # Verification runs on its own small pool so it never holds up a download slot;
+        # the image is archived once it has passed.
+        if self.verifier is None or self.manifest is None:
+            self.archive_image(filepath)
+        else:
+            self.verifier.submit(self._verify_image, filepath)
+
+    def _verify_image(self, filepath):
+        try:
+            entry = self.manifest.find_path(filepath)
+            if entry is None or not entry['sha256'] or not os.path.exists(filepath):
+                self.archive_image(filepath)
+                return
+
+            verified = self.manifest.verification(entry['sha256'])
+            if verified is None:
+                image_format, width, height, problem = sniff_image(filepath)
+                self.manifest.record_verification(entry['sha256'], image_format, width, height, problem)
+            else:
+                image_format, problem = verified
+
+            if problem:
+                self.quarantine(entry, problem)
+            else:
+                fixed = self.fix_extension(entry, image_format)
+                if fixed is not None:
+                    self.archive_image(fixed)
+        except Exception as e:
+            self.log_message(f"⚠️ Could not verify {os.path.basename(filepath)}: {e}")
+
+    def fix_extension(self, entry, image_format, final=False):
+        filepath = entry['path']
+        stem, ext = os.path.splitext(filepath)
+        extensions = IMAGE_EXTENSIONS.get(image_format)
+        if not extensions or ext.lower() in extensions:
+            return filepath
+
+        fixed = stem + extensions[0]
+        if os.path.exists(fixed) and self.manifest.find_path(fixed) is not None:
+            if not final:
+                # On a shifted page the comic there may still be moving to its new name; retried
+                # once every download of the run is recorded.
+                self.blocked_renames.append((entry, image_format))
+                return None
+            self.log_message(f"⚠️ {os.path.basename(filepath)} is {image_format.upper()}, "
+                             f"but {os.path.basename(fixed)} already exists")
+            return filepath
+        os.replace(filepath, fixed)
+        self.manifest.record(entry['source'], entry['comic_id'], entry['url'], fixed, entry['size'], entry['sha256'])
+        self.log_message(f"ℹ️ Renamed {os.path.basename(filepath)} to {os.path.basename(fixed)}")
+        return fixed
+
+    def quarantine(self, entry, problem):
+        filepath = entry['path']
+        folder = os.path.dirname(filepath)
+        target = os.path.join(self.get_save_path(), QUARANTINE_DIR, os.path.basename(folder))
+        os.makedirs(target, exist_ok=True)
+        target = os.path.join(target, os.path.basename(filepath))
+        # An image that is already in quarantine has had its retry; clearing the folder gives it another.
+        retried = os.path.exists(target)
+        os.replace(filepath, target)
+        self.manifest.forget(entry['source'], entry['comic_id'])
+        if retried:
+            self.log_message(f"❌ Quarantined {os.path.basename(filepath)} again: {problem}")
+        else:
+            self.log_message(f"❌ Quarantined {os.path.basename(filepath)}: {problem}")
+            self.requeued.append((folder, entry))
+
+    def finish_verification(self):
+        verifier, self.verifier = self.verifier, None
+        if verifier is None:
+            return
+        verifier.shutdown(wait=True)
+
+        blocked, self.blocked_renames = self.blocked_renames, []
+        for entry, image_format in blocked:
+            entry = self.manifest.get(entry['source'], entry['comic_id'])
+            if entry is not None and os.path.exists(entry['path']):
+                self.archive_image(self.fix_extension(entry, image_format, final=True))
+
+        requeued, self.requeued = self.requeued, []
+        # Re-queued only once the run is over, so the items are not settled by the run that
+        # downloaded them. Single-page sources pick the missing file up on their next pass anyway.
+        for folder, entry in requeued:
+            if entry['source'] == "XKCD":
+                self.plan_work(folder, 'xkcd', [(entry['comic_id'], 1, {'latest': int(entry['comic_id'])})])
+            elif entry['source'] not in ("SMBC", "The_Oatmeal", "Cyanide_Happiness"):
+                self.plan_work(folder, 'image', [(entry['url'], 1, {'filename': os.path.basename(entry['path']),
+                                                                    'referer': None,
+                                                                    'comic_id': entry['comic_id']})])
+        if requeued:
+            self.log_message(f"⚠️ {len(requeued)} bad image(s) moved to {QUARANTINE_DIR} "
+                             f"and queued for the next run")
+
+    def archive_image(self, filepath):
+        if not self.settings['cbz_output'] or self.shard is not None or not os.path.exists(filepath):
+            return
+        folder = os.path.dirname(filepath)
+        try:
+            with self.archives_lock:
+                archive = self.archives.get(folder)
+                if archive is None:
+                    archive = self.archives[folder] = CbzArchive(folder + '.cbz')
+                    if archive.salvaged is not None:
+                        self.log_message(f"⚠️ {os.path.basename(archive.path)} was not closed cleanly, "
+                                         f"rebuilt its index ({archive.salvaged} images kept)")
+            archive.add(filepath, os.path.basename(filepath))
+        except (OSError, zipfile.BadZipFile) as e:
+            self.log_message(f"⚠️ Could not add {os.path.basename(filepath)} to {os.path.basename(folder)}.cbz: {e}")
+
+    def close_archives(self):
+        with self.archives_lock:
+            archives, self.archives = self.archives, {}
+        for archive in archives.values():
+            try:
+                archive.close()
+            except OSError as e:
+                self.log_message(f"⚠️ Could not finish {os.path.basename(archive.path)}: {e}")
+                continue
+            if archive.added:
+                self.log_message(f"📦 {os.path.basename(archive.path)}: added {archive.added} images "
+                                 f"({len(archive.names)} total)")
+
+    def ensure_metrics_server(self):
+        port = self.settings['metrics_port']
+        if not port or self.metrics_server is not None:
+            return self.metrics_server
+        try:
+            self.metrics_server = MetricsServer(self, port)
+            self.log_message(f"ℹ️ Serving metrics on http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            self.log_message(f"⚠️ Could not start metrics endpoint on port {port}: {e}")
+        return self.metrics_server
+
+    def finish_metrics(self, metrics):
+        metrics.finish()
+        summary = metrics.summary()
+        for row in sorted(summary['hosts'], key=lambda row: row['seconds'], reverse=True)[:5]:
+            average_ttfb = row['ttfb_seconds'] / row['requests'] * 1000 if row['requests'] else 0.0
+            self.log_message(
+                f"📊 {row['source']} {row['host']}: {row['requests']} requests, "
+                f"{row['bytes'] / (1024 * 1024):.2f} MB, avg TTFB {average_ttfb:.0f} ms, "
+                f"{row['errors']} errors, {row['cache_hits']} cache hits")
+
+        report_path = self.state_path(RUN_REPORT_FILE)
+        try:
+            with open(report_path, 'w') as f:
+                json.dump({'stopped': self.stop_event.is_set(), **summary}, f, indent=2)
+        except OSError as e:
+            self.log_message(f"⚠️ Could not write run report: {e}")
+
+    def get_max_downloads(self, comic_name=None):
+        try:
+            return int(self.comic_config(comic_name).get('max_comics', self.get_option('max_comics')))
+        except ValueError:
+            self.log_message(
+                "Invalid value for Max comics. Using default (1).")
+            return 1
+
+    def download_single_comic(self, comic_name, base_url):
+        if self.stop_event.is_set():
+            return 0
+
+        max_downloads = self.get_max_downloads(comic_name)
+
+        comic_folder = os.path.join(
+            self.get_save_path(), comic_folder_name(comic_name))
+        os.makedirs(comic_folder, exist_ok=True)
+        self.open_work(comic_folder, base_url)
+
+        if comic_name == "XKCD":
+            return self.download_xkcd(comic_folder, base_url, max_downloads)
+        elif comic_name == "Dilbert":
+            return self.download_dilbert(comic_folder, base_url, max_downloads)
+        elif comic_name == "SMBC":
+            return self.download_smbc(comic_folder, base_url)
+        elif comic_name == "The Oatmeal":
+            return self.download_oatmeal(comic_folder, base_url, max_downloads)
+        elif comic_name == "Cyanide & Happiness":
+            return self.download_cyanide(comic_folder, base_url)
+        else:
+            return self.download_generic(comic_folder, base_url, max_downloads)
+
+    def get_worker_count(self):
+        try:
+            return max(1, int(self.get_option('workers')))
+        except ValueError:
+            return DEFAULT_WORKERS
+
+    def ensure_http_client(self):
+        pool_maxsize = max(self.settings['pool_maxsize'],
+                           self.settings['max_per_host'], self.get_worker_count())
+        if self.http is None or self.http.pool_maxsize < pool_maxsize:
+            if self.http is not None:
+                self.http.close()
+            self.http = HttpClient(pool_connections=self.settings['pool_connections'],
+                                   pool_maxsize=pool_maxsize,
+                                   timeout=self.settings['timeout'],
+                                   max_connections=self.settings['max_connections'],
+                                   max_per_host=self.settings['max_per_host'])
+        self.http.metrics = self.metrics
+        self.http.politeness = self.politeness
+        return self.http
+
+    def ensure_manifest(self):
+        manifest_path = self.state_path(MANIFEST_FILE)
+        if self.manifest is None or self.manifest.path != manifest_path:
+            if self.manifest is not None:
+                self.manifest.close()
+            self.manifest = DownloadManifest(manifest_path)
+
+        self.content_store = None
+        if self.settings['content_store']:
+            self.content_store = ContentStore(
+                os.path.join(self.get_save_path(), CONTENT_STORE_DIR))
+        return self.manifest
+
+    def ensure_work_queue(self):
+        queue_path = self.state_path(WORK_QUEUE_FILE)
+        if self.work_queue is None or self.work_queue.path != queue_path:
+            if self.work_queue is not None:
+                self.work_queue.close()
+            self.work_queue = WorkQueue(queue_path)
+        return self.work_queue
+
+    def ensure_http_cache(self):
+        cache_path = self.state_path(HTTP_CACHE_FILE)
+        if self.http_cache is None or self.http_cache.path != cache_path:
+            if self.http_cache is not None:
+                self.http_cache.close()
+            self.http_cache = HttpCache(
+                cache_path, self.settings['http_cache_mb'] * 1024 * 1024)
+        return self.http_cache
+
+    def fetch_page(self, url):
+        if self.http_cache is None:
+            response = self.http.get(url)
+            response.raise_for_status()
+            return CachedPage(response.content, None, False)
+
+        entry, headers = self.http_cache.validators(url)
+        response = self.http.get(url, headers=headers)
+        if response.status_code == 304 and entry:
+            return self.http_cache.not_modified(url, entry)
+        response.raise_for_status()
+        self.http_cache.store(url, response.headers, response.content)
+        return CachedPage(response.content, None, False)
+
+    def parse_page(self, url, page, extractor, parse_only=None):
+        if page.not_modified and page.derived is not None:
+            return page.derived
+
+        result = extractor(parse_html(page.content, parse_only))
+        if self.http_cache is not None:
+            self.http_cache.store_derived(url, result)
+        return result
+
+    def extract_page(self, url, extractor, parse_only=None):
+        return self.parse_page(url, self.fetch_page(url), extractor, parse_only)
+
+    def known_comic(self, source, comic_id):
+        if self.manifest is None:
+            return None
+        entry = self.manifest.get(source, comic_id)
+        if entry and os.path.exists(entry['path']):
+            return entry
+        return None
+
+    def item_priority(self, position):
+        return PRIORITY_LATEST if position <= self.settings['latest_window'] else PRIORITY_BACKFILL
+
+    def throttle_bandwidth(self, url, source, nbytes, priority):
+        if self.bandwidth is None:
+            return
+        delay = self.bandwidth.reserve(nbytes, priority)
+        if not delay:
+            return
+        started = time.monotonic()
+        # More urgent transfers may have queued ahead while we slept.
+        while delay and not self.stop_event.wait(delay):
+            delay = self.bandwidth.wait_time(priority)
+        self.metrics.count(url, 'throttle_seconds', time.monotonic() - started, source=source)
+
+    def skipped_known(self, entry):
+        self.log_message(f"⏩ Already exists: {os.path.basename(entry['path'])}")
+        self.verify_image(entry['path'])
+        self.metrics.count(entry['url'] or '', 'skipped', source=entry['source'])
+        self.item_done()
+
+    def record_download(self, source, comic_id, img_url, filepath, size=None, sha256=None):
+        if self.manifest is None:
+            return
+        if sha256 is None:
+            size = os.path.getsize(filepath)
+            sha256 = file_sha256(filepath)
+        if self.content_store is not None:
+            self.content_store.ingest(filepath, sha256)
+        self.manifest.record(source, comic_id, img_url, filepath, size, sha256)
+
+    def skip_existing(self, source, comic_id, img_url, filepath, filename):
+        if self.manifest is None:
+            if os.path.exists(filepath):
+                self.log_message(f"⏩ Already exists: {filename}")
+                return True
+            return False
+
+        # Only the comic's own manifest row vouches for a file; on a generic page the same
+        # path can hold a different image once the page has shifted.
+        entry = self.known_comic(source, comic_id)
+        if entry is not None and os.path.splitext(entry['path'])[0] == os.path.splitext(filepath)[0]:
+            # Verification may have given the file its real extension.
+            if not entry['url'] or entry['url'] == img_url:
+                self.log_message(f"⏩ Already exists: {os.path.basename(entry['path'])}")
+                return True
+            self.log_message(f"🔄 Changed upstream: {filename}")
+        elif os.path.exists(filepath):
+            if entry is None and self.manifest.find_path(filepath) is None:
+                size, sha256 = os.path.getsize(filepath), file_sha256(filepath)
+                if not self.manifest.has_content(sha256):
+                    # A file saved before the manifest existed.
+                    self.log_message(f"⏩ Already exists: {filename}")
+                    self.record_download(source, comic_id, img_url, filepath, size, sha256)
+                    return True
+            self.log_message(f"🔄 Changed upstream: {filename}")
+        return self.link_from_store(source, comic_id, img_url, filepath, filename)
+
+    def link_from_store(self, source, comic_id, img_url, filepath, filename):
+        if self.content_store is None:
+            return False
+
+        entry = self.manifest.find_any_url(img_url)
+        if entry is None or not self.content_store.has(entry['sha256']):
+            return False
+
+        self.content_store.link(entry['sha256'], filepath)
+        self.manifest.record(source, comic_id, img_url,
+                             filepath, entry['size'], entry['sha256'])
+        self.log_message(f"🔗 Linked from store: {filename}")
+        return True
+
+    def is_incremental(self):
+        return self.manifest is not None and self.get_option('incremental') and self.shard is None
+
+    def open_work(self, folder, base_url):
+        if self.work_queue is not None:
+            self.work_origins[os.path.basename(folder)] = base_url
+            self.work_queue.discard_stale(os.path.basename(folder), base_url)
+
+    def resumed_work(self, folder, kind):
+        if self.work_queue is None:
+            return []
+        source = os.path.basename(folder)
+        items = self.work_queue.pending(source, kind)
+        if items:
+            self.log_message(f"🔄 {source}: Resuming {len(items)} queued {kind} item(s) from an interrupted run")
+        return items
+
+    def plan_work(self, folder, kind, items, done=None):
+        if self.work_queue is not None:
+            source = os.path.basename(folder)
+            self.work_queue.add(source, self.work_origins.get(source, ''), kind, items, done)
+
+    def settle_work(self, folder, kind, key, saved=False):
+        # Interrupted work stays queued; anything that actually ran is settled, failures
+        # included, since the manifest and .part files already take care of retrying those.
+        if self.work_queue is not None and (saved or not self.stop_event.is_set()):
+            self.work_queue.done(os.path.basename(folder), kind, key)
+
+    def plan_image(self, folder, img_url, filename, position, referer=None, comic_id=None):
+        self.plan_work(folder, 'image', [(img_url, position, {'filename': filename, 'referer': referer,
+                                                              'comic_id': comic_id})])
+
+    def resumed_xkcd(self, folder):
+        resumed = self.resumed_work(folder, 'xkcd')
+        if not resumed:
+            return None, []
+        return resumed[0][2]['latest'], [int(comic_num) for comic_num, _, _ in resumed]
+
+    def plan_xkcd(self, folder, latest_num, max_downloads):
+        if self.shard is None:
+            comic_nums = self.xkcd_comic_numbers(latest_num, max_downloads)
+        else:
+            comic_nums = self.shard.xkcd_ids(latest_num)
+            self.manifest.plan_archive("XKCD", comic_nums)
+            self.log_message(f"ℹ️ XKCD shard {self.shard.label}: {len(comic_nums)} comics to archive")
+        self.plan_work(folder, 'xkcd', [(comic_num, position, {'latest': latest_num})
+                                        for position, comic_num in enumerate(comic_nums, start=1)])
+        return comic_nums
+
+    def plan_strips(self, source, folder, base_url):
+        resumed = self.resumed_work(folder, 'strip')
+        if resumed:
+            return [page_url for page_url, _, _ in resumed]
+        page_urls = self.shard.dilbert_pages(base_url)
+        self.manifest.plan_archive(source, [page_comic_id(page_url) for page_url in page_urls])
+        self.plan_work(folder, 'strip', [(page_url, position, {})
+                                         for position, page_url in enumerate(page_urls, start=1)])
+        self.log_message(f"ℹ️ {source} shard {self.shard.label}: {len(page_urls)} strips to archive")
+        return page_urls
+
+    def crawl_start(self, folder, base_url, max_pages, resuming):
+        pages = self.resumed_work(folder, 'page')
+        if pages:
+            page_url, position, page = pages[-1]
+            return page_url, position, page['limit']
+        if resuming:
+            return None, 1, 0
+        self.plan_work(folder, 'page', [(base_url, 1, {'limit': max_pages})])
+        return base_url, 1, max_pages
+
+    def advance_crawl(self, folder, page_url, next_url=None, position=0, max_pages=0):
+        next_page = [(next_url, position + 1, {'limit': max_pages})] if next_url and position < max_pages else []
+        self.plan_work(folder, 'page', next_page, done=page_url)
+
+    def xkcd_comic_numbers(self, latest_num, max_downloads):
+        high_water = self.manifest.get_mark("XKCD") if self.is_incremental() else None
+
+        if high_water is None:
+            numbers = range(latest_num, latest_num - max_downloads, -1)
+        else:
+            numbers = range(latest_num, int(high_water), -1)
+            if not numbers:
+                self.log_message(f"ℹ️ XKCD is up to date (#{high_water}).")
+
+        return [comic_num for comic_num in numbers if comic_num not in (404, 0)]
+
+    def finish_xkcd_sync(self, latest_num, comic_nums):
+        if not self.is_incremental():
+            return
+        previous = self.manifest.get_mark("XKCD")
+        if previous is None and not comic_nums:
+            return
+
+        # Taken from the manifest rather than this run's results: a resumed run only sees the
+        # leftover numbers, and comics that failed before the interruption must still hold the mark.
+        first = min(comic_nums) if previous is None else int(previous) + 1
+        missing = [comic_num for comic_num in self.manifest.missing_numbers("XKCD", first, latest_num)
+                   if comic_num not in (404, 0)]
+        high_water = min(missing) - 1 if missing else latest_num
+        if previous is None or high_water > int(previous):
+            self.manifest.set_mark("XKCD", high_water)
+
+    def reached_known_strip(self, source, page_url, base_url):
+        if not self.is_incremental() or page_url == base_url:
+            return False
+        if self.known_comic(source, page_comic_id(page_url)) is None:
+            return False
+        self.log_message(
+            f"ℹ️ {source}: Reached an already downloaded strip ({page_comic_id(page_url)}). Stopping.")
+        return True
+
+    def _download_image(self, img_url, filepath, filename, referer=None, comic_id=None, position=1):
+        try:
+            saved = self._fetch_image(img_url, filepath, filename, referer, comic_id, position)
+            if saved:
+                self.verify_image(filepath)
+            self.settle_work(os.path.dirname(filepath), 'image', img_url, saved)
+            return saved
+        finally:
+            self.item_done()
+
+    def _fetch_image(self, img_url, filepath, filename, referer, comic_id, position):
+        if not img_url:
+            return False
+
+        img_url = clean_image_url(img_url)
+        source = os.path.basename(os.path.dirname(filepath))
+        comic_id = comic_id or img_url
+
+        if self.skip_existing(source, comic_id, img_url, filepath, filename):
+            self.metrics.count(img_url, 'skipped', source=source)
+            return True
+
+        part = PartFile(filepath)
+        try:
+            rank = self.item_priority(position)
+            while True:
+                headers = part.range_headers()
+                if referer:
+                    headers['Referer'] = referer
+
+                with self.http.stream(img_url, source=source, priority=rank, headers=headers) as img_response:
+                    if img_response.status_code != 416:
+                        img_response.raise_for_status()
+                    if not part.accepts(img_response.status_code, img_response.headers):
+                        self.log_message(f"🔄 Server rejected resume of {filename} at byte {part.offset}, restarting")
+                        part.restart()
+                        continue
+                    resumed = part.open(img_response.status_code, img_response.headers)
+
+                    priority = (rank, size_class(part.expected))
+                    chunk_size = stream_chunk_size(part.expected, self.bandwidth)
+                    for chunk in img_response.iter_content(chunk_size=chunk_size):
+                        if self.stop_event.is_set():
+                            part.close()
+                            return False
+                        part.write(chunk)
+                        self.throttle_bandwidth(img_url, source, len(chunk), priority)
+                break
+
+            if not part.commit():
+                self.log_message(
+                    f"❌ Incomplete download: {filename} ({part.size}/{part.expected} bytes), will resume next run")
+                return False
+
+            self.record_download(source, comic_id, img_url,
+                                 filepath, part.size, part.sha256())
+            self.log_message(
+                f"✅ Downloaded: {filename}" + (f" (resumed at {part.offset} bytes)" if resumed else ""))
+            return True
+        except requests.exceptions.RequestException as e:
+            part.close()
+            self.log_message(f"❌ Failed to download image {img_url}: {e}")
+            return False
+        except Exception as e:
+            part.close()
+            self.log_message(f"❌ File operation error for {filename}: {e}")
+            return False
+        finally:
+            self.metrics.count(img_url, 'write_seconds', part.write_seconds, source=source)
+
+    def _download_xkcd_comic(self, folder, base_url, comic_num, position):
+        if self.stop_event.is_set():
+            return False
+
+        known = self.known_comic("XKCD", comic_num)
+        if known:
+            self.skipped_known(known)
+            return True
+
+        try:
+            comic_url = urljoin(base_url, f"{comic_num}/info.0.json")
+            response = self.http.get(comic_url, priority=self.item_priority(position))
+            response.raise_for_status()
+            comic_data = response.json()
+
+            img_url = comic_data.get("img")
+            filename = xkcd_filename(comic_num, comic_data)
+            filepath = os.path.join(folder, filename)
+
+            return self._download_image(img_url, filepath, filename, comic_id=comic_num, position=position)
+
+        except requests.exceptions.HTTPError as e:
+            self.log_message(
+                f"⚠️ XKCD #{comic_num} not found or failed (HTTP Error: {e.response.status_code})")
+        except Exception as e:
+            self.log_message(
+                f"❌ Failed to download XKCD #{comic_num}: {str(e)}")
+        return False
+
+    def download_xkcd(self, folder, base_url, max_downloads):
+        if self.stop_event.is_set():
+            return 0
+        downloaded = 0
+
+        def download(comic_num, position):
+            saved = self._download_xkcd_comic(folder, base_url, comic_num, position)
+            self.settle_work(folder, 'xkcd', comic_num, saved)
+            return saved
+
+        try:
+            latest_num, comic_nums = self.resumed_xkcd(folder)
+            if not comic_nums:
+                latest_num = json.loads(self.fetch_page(
+                    urljoin(base_url, "info.0.json")).content)["num"]
+                comic_nums = self.plan_xkcd(folder, latest_num, max_downloads)
+
+            workers = min(self.get_worker_count(), len(comic_nums))
+            succeeded = set()
+
+            if workers <= 1:
+                for position, comic_num in enumerate(comic_nums, start=1):
+                    if self.stop_event.is_set():
+                        break
+                    if download(comic_num, position):
+                        succeeded.add(comic_num)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {executor.submit(download, comic_num, position): comic_num
+                               for position, comic_num in enumerate(comic_nums, start=1)}
+                    for future in as_completed(futures):
+                        if self.stop_event.is_set():
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            break
+                        if future.result():
+                            succeeded.add(futures[future])
+
+            downloaded = len(succeeded)
+            self.finish_xkcd_sync(latest_num, comic_nums)
+
+        except Exception as e:
+            self.log_message(
+                f"❌ XKCD download failed (Initial check): {str(e)}")
 
+        return downloaded
+
+    def download_dilbert(self, folder, base_url, max_downloads):
+        if self.stop_event.is_set():
+            return 0
+        def extractor(soup, page_url):
+            return find_dilbert_comic(soup, page_url, base_url)
+
+        if self.shard is not None:
+            return self.download_strips("Dilbert", folder, self.plan_strips("Dilbert", folder, base_url),
+                                        extractor, NAVIGATION_TAGS)
+        return self.crawl_sequential("Dilbert", folder, base_url, max_downloads, extractor, NAVIGATION_TAGS)
+
+    def _download_strip(self, source, folder, page_url, extractor, parse_only, position):
+        if self.stop_event.is_set():
+            return False
+
+        known = self.known_comic(source, page_comic_id(page_url))
+        if known:
+            self.skipped_known(known)
+            return True
+
+        try:
+            img_url, filename, _ = self.extract_page(
+                page_url, lambda soup: extractor(soup, page_url), parse_only)
+        except requests.exceptions.RequestException as e:
+            self.log_message(f"❌ {source} download failed on {page_url}: {str(e)}")
+            return False
+        if not img_url:
+            self.log_message(f"⚠️ {source}: Could not find comic image on {page_url}")
+            return False
+        return self._download_image(img_url, os.path.join(folder, filename), filename, referer=page_url,
+                                    comic_id=page_comic_id(page_url), position=position)
+
+    def download_strips(self, source, folder, page_urls, extractor, parse_only=None):
+        # Archive shards know every strip URL up front, so pages are fetched in parallel
+        # instead of following the "previous" links one page at a time.
+        def download(page_url, position):
+            saved = self._download_strip(source, folder, page_url, extractor, parse_only, position)
+            self.settle_work(folder, 'strip', page_url, saved)
+            return saved
+
+        with ThreadPoolExecutor(max_workers=self.get_worker_count()) as executor:
+            return sum(1 for saved in executor.map(download, page_urls, itertools.count(1)) if saved)
+
+    def crawl_sequential(self, source, folder, base_url, max_pages, extractor, parse_only=None):
+        downloaded = 0
+        resumed = self.resumed_images(folder)
+        current_url, first_position, max_pages = self.crawl_start(folder, base_url, max_pages, bool(resumed))
+        lookahead = max(1, self.settings['crawl_lookahead'])
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=lookahead) as executor:
+            pending.extend(executor.submit(job) for job in resumed)
+            try:
+                for position in range(first_position, max_pages + 1):
+                    if self.stop_event.is_set() or current_url is None:
+                        break
+                    if self.reached_known_strip(source, current_url, base_url):
+                        self.advance_crawl(folder, current_url)
+                        break
+
+                    img_url, filename, next_url = self.extract_page(
+                        current_url, lambda soup: extractor(soup, current_url), parse_only)
+                    if not img_url:
+                        self.log_message(
+                            f"⚠️ {source}: Could not find comic image on {current_url}")
+                        self.advance_crawl(folder, current_url)
+                        break
+
+                    pending.append(executor.submit(self.queued_image(
+                        folder, img_url, filename, position, referer=current_url,
+                        comic_id=page_comic_id(current_url))))
+                    while len(pending) > lookahead:
+                        if pending.popleft().result():
+                            downloaded += 1
+
+                    if not next_url or next_url == current_url:
+                        self.log_message(
+                            "ℹ️ Reached the oldest comic accessible or navigation failed.")
+                        self.advance_crawl(folder, current_url)
+                        break
+
+                    self.advance_crawl(folder, current_url, next_url, position, max_pages)
+                    current_url = next_url
+
+            except requests.exceptions.RequestException as e:
+                self.log_message(
+                    f"❌ {source} download failed on {current_url}: {str(e)}")
+            except Exception as e:
+                self.log_message(
+                    f"❌ {source} download failed (General Error): {str(e)}")
+                self.advance_crawl(folder, current_url)
+
+            downloaded += sum(1 for future in pending if future.result())
+
+        return downloaded
+
+    def download_smbc(self, folder, base_url):
+        if self.stop_event.is_set():
+            return 0
+
+        try:
+            img_url, filename = self.extract_page(
+                base_url, lambda soup: find_latest_comic(soup, 'cc-comic', 'smbc'),
+                {'name': 'img', 'id': 'cc-comic'})
+            if img_url:
+                filepath = os.path.join(folder, filename)
+
+                if self._download_image(img_url, filepath, filename):
+                    return 1
+
+            self.log_message(
+                "⚠️ SMBC: Could not find the comic image on the main page.")
+            return 0
+
+        except requests.exceptions.RequestException as e:
+            self.log_message(f"❌ SMBC download failed: {str(e)}")
+            return 0
+
+    def download_cyanide(self, folder, base_url):
+        if self.stop_event.is_set():
+            return 0
+
+        try:
+            img_url, filename = self.extract_page(
+                base_url, lambda soup: find_latest_comic(soup, 'main-comic', 'cyanide'),
+                {'name': 'img', 'id': 'main-comic'})
+            if img_url:
+                filepath = os.path.join(folder, filename)
+
+                if self._download_image(img_url, filepath, filename):
+                    return 1
+
+            self.log_message(
+                "⚠️ Cyanide & Happiness: Could not find the comic image on the latest page.")
+            return 0
+
+        except requests.exceptions.RequestException as e:
+            self.log_message(
+                f"❌ Cyanide & Happiness download failed: {str(e)}")
+            return 0
+
+    def stream_page_images(self, page_url, candidate, max_downloads, download):
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.get_worker_count()) as executor:
+            with self.http.stream(page_url) as response:
+                response.raise_for_status()
+                for img_url in scan_image_urls(response.iter_content(chunk_size=16384),
+                                               charset_from_headers(response.headers)):
+                    if self.stop_event.is_set():
+                        break
+                    item = candidate(img_url)
+                    if item:
+                        futures.append(executor.submit(
+                            download, item, len(futures) + 1))
+                        if len(futures) >= max_downloads:
+                            break
+
+        return sum(1 for future in futures if future.result())
+
+    def download_candidates(self, candidates, max_downloads, download):
+        downloaded = 0
+        for item in candidates:
+            if self.stop_event.is_set():
+                break
+
+            if download(item, downloaded + 1):
+                downloaded += 1
+                if downloaded >= max_downloads:
+                    break
+        return downloaded
+
+    def queued_image(self, folder, img_url, filename, position, referer=None, comic_id=None, resumed=False):
+        # Images are queued as soon as they are discovered, before a worker picks them up.
+        if not resumed:
+            self.plan_image(folder, img_url, filename, position, referer, comic_id)
+        return lambda: self._download_image(img_url, os.path.join(folder, filename), filename,
+                                            referer=referer, comic_id=comic_id, position=position)
+
+    def resumed_images(self, folder):
+        return [self.queued_image(folder, img_url, image['filename'], position, image['referer'],
+                                  image['comic_id'], resumed=True)
+                for img_url, position, image in self.resumed_work(folder, 'image')]
+
+    def download_resumed(self, jobs):
+        with ThreadPoolExecutor(max_workers=self.get_worker_count()) as executor:
+            return sum(1 for saved in executor.map(lambda job: job(), jobs) if saved)
+
+    def download_page_images(self, page_url, extractor, candidate, max_downloads, download):
+        if self.settings['stream_html']:
+            return self.stream_page_images(page_url, candidate, max_downloads, download)
+        return self.download_candidates(self.extract_page(page_url, extractor, IMAGE_TAGS),
+                                        max_downloads, download)
+
+    def download_oatmeal(self, folder, base_url, max_downloads):
+        if self.stop_event.is_set():
+            return 0
+
+        def download(item, position):
+            full_img_url, filename = item
+            filepath = os.path.join(folder, filename)
+            return self._download_image(full_img_url, filepath, filename, referer=base_url, position=position)
+
+        try:
+            downloaded = self.download_page_images(
+                base_url, lambda soup: list(find_oatmeal_images(soup, base_url)),
+                lambda img_url: oatmeal_candidate(img_url, base_url), max_downloads, download)
+
+            if downloaded == 0:
+                self.log_message(
+                    "⚠️ The Oatmeal: Could not find reliable comic image links on the main page.")
+
+            return downloaded
+
+        except requests.exceptions.RequestException as e:
+            self.log_message(f"❌ The Oatmeal download failed: {str(e)}")
+            return 0
+
+    def crawl_page(self, page_url):
+        page = self.fetch_page(page_url)
+        return find_crawl_links(parse_html(page.content, NAVIGATION_TAGS), page_url)
+
+    def crawl_generic(self, folder, base_url, max_downloads):
+        frontier = CrawlFrontier(base_url, os.path.join(folder, CRAWL_STATE_FILE),
+                                 self.settings['crawl_pages'], self.settings['crawl_depth'])
+        source = os.path.basename(folder)
+        workers = self.get_worker_count()
+        futures = []
+        known = visited = 0
+
+        def download(img_url, position, page_url):
+            return self.queued_image(folder, img_url, crawl_filename(img_url), position, referer=page_url)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pages, \
+                    ThreadPoolExecutor(max_workers=workers) as downloads:
+                fetching = {}
+                while not self.stop_event.is_set() and len(futures) + known < max_downloads:
+                    while len(fetching) < workers:
+                        item = frontier.pop()
+                        if item is None:
+                            break
+                        fetching[pages.submit(self.crawl_page, item[0])] = item
+                    if not fetching:
+                        break
+
+                    done, _ = wait(fetching, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page_url, depth = fetching.pop(future)
+                        try:
+                            img_urls, links = future.result()
+                        except requests.exceptions.RequestException as e:
+                            self.log_message(f"⚠️ Generic crawl: skipped {page_url}: {e}")
+                            continue
+                        visited += 1
+                        for img_url in img_urls:
+                            if len(futures) + known < max_downloads and frontier.new_image(img_url):
+                                entry = self.known_comic(source, img_url)
+                                if entry:
+                                    self.skipped_known(entry)
+                                    known += 1
+                                    continue
+                                futures.append(downloads.submit(download(img_url, len(futures) + known + 1,
+                                                                         page_url)))
+                        for link in links:
+                            frontier.push(link, depth + 1)
+                pages.shutdown(cancel_futures=True)
+        finally:
+            frontier.close()
+
+        self.log_message(f"ℹ️ Generic crawl: visited {visited} of {frontier.queued} queued pages.")
+        return known + sum(1 for future in futures if future.result())
+
+    def download_generic(self, folder, base_url, max_downloads):
+        if self.stop_event.is_set():
+            return 0
+
+        resumed = self.resumed_images(folder)
+        if resumed:
+            return self.download_resumed(resumed)
+
+        if self.settings['crawl_pages']:
+            downloaded = self.crawl_generic(folder, base_url, max_downloads)
+            if downloaded == 0:
+                self.log_message("⚠️ Generic Scraper: Found no relevant images to download.")
+            return downloaded
+
+        def download(full_img_url, position):
+            filename = generic_filename(position, full_img_url)
+            filepath = os.path.join(folder, filename)
+            return self._download_image(full_img_url, filepath, filename, referer=base_url, position=position)
+
+        try:
+            downloaded = self.download_page_images(
+                base_url, lambda soup: list(find_generic_images(soup, base_url)),
+                lambda img_url: generic_candidate(img_url, base_url), max_downloads, download)
+
+            if downloaded == 0:
+                self.log_message(
+                    "⚠️ Generic Scraper: Found no relevant images to download.")
 
-class ComicDownloaderGUI:
+            return downloaded
+
+        except requests.exceptions.RequestException as e:
+            self.log_message(f"❌ Generic download failed: {str(e)}")
+            return 0
+
+
+class ComicDownloaderGUI(ComicDownloader):
     def __init__(self, root):
+        super().__init__()
         self.root = root
         self.root.title("Web Comic Downloader")
         self.root.geometry("700x600")
         self.root.minsize(600, 500)
 
-        self.comics_config = {
-            "XKCD": "https://xkcd.com/",
-            "Dilbert": "https://dilbert.com/strip",
-            "SMBC": "https://www.smbc-comics.com/",
-            "The Oatmeal": "https://theoatmeal.com/",
-            "Cyanide & Happiness": "https://explosm.net/comics/latest"
-        }
-
-        self.stop_event = threading.Event()
+        self.log_queue = queue.Queue()
+        self.ui_queue = queue.Queue()
 
         self.setup_ui()
         self.load_config()
+        self.root.after(UI_REFRESH_MS, self.process_ui_queue)
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -39,6 +3376,7 @@ class ComicDownloaderGUI:
                 self.stop_event.set()
                 self.root.destroy()
         else:
+            self.close()
             self.root.destroy()
 
     def setup_ui(self):
@@ -82,8 +3420,7 @@ class ComicDownloaderGUI:
         options_subframe.pack(fill=tk.X)
 
         ttk.Label(options_subframe, text="💾 Save to:").pack(side=tk.LEFT)
-        self.save_path = tk.StringVar(
-            value=os.path.join(os.path.expanduser("~"), "Comics"))
+        self.save_path = tk.StringVar(value=DEFAULT_OPTIONS['save_path'])
         ttk.Entry(options_subframe, textvariable=self.save_path,
                   width=20).pack(side=tk.LEFT, padx=5)
         ttk.Button(options_subframe, text="Browse",
@@ -97,6 +3434,26 @@ class ComicDownloaderGUI:
         ttk.Spinbox(max_comics_frame, from_=1, to=100,
                     textvariable=self.max_comics, width=5).pack(side=tk.LEFT, padx=5)
 
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.pack(fill=tk.X)
+        ttk.Label(workers_frame, text="Parallel downloads:").pack(
+            side=tk.LEFT)
+        self.workers = tk.StringVar(value=str(DEFAULT_WORKERS))
+        ttk.Spinbox(workers_frame, from_=1, to=32,
+                    textvariable=self.workers, width=5).pack(side=tk.LEFT, padx=5)
+
+        self.incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Incremental sync (only new comics)",
+                        variable=self.incremental).pack(anchor=tk.W)
+
+        self.async_engine_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Use asyncio engine",
+                        variable=self.async_engine_var).pack(anchor=tk.W)
+
+        self.option_vars = {'save_path': self.save_path, 'max_comics': self.max_comics,
+                            'workers': self.workers, 'incremental': self.incremental,
+                            'async_engine': self.async_engine_var}
+
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(pady=15)
 
@@ -154,28 +3511,77 @@ class ComicDownloaderGUI:
         self.progress_label.config(text="Ready to download comics...")
         self.progress_bar["value"] = 0
 
+    def get_option(self, name):
+        return self.option_vars[name].get()
+
+    def set_status(self, text):
+        self.ui_call(self.progress_label.config, text=text)
+
+    def set_progress(self, value, maximum=None):
+        if maximum is None:
+            self.ui_call(self.progress_bar.config, value=value)
+        else:
+            self.ui_call(self.progress_bar.config, maximum=maximum, value=value)
+
+    def notify(self, title, message, error=False):
+        self.ui_call(messagebox.showerror if error else messagebox.showinfo, title, message)
+
+    def download_finished(self):
+        self.ui_call(self.download_btn.config, state=tk.NORMAL)
+        self.ui_call(self.stop_btn.config, state=tk.DISABLED)
+
     def log_message(self, message):
-        self.log_text.config(state=tk.NORMAL)
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update()
+        self.log_queue.put(f"[{timestamp}] {message}\n")
+
+    def ui_call(self, func, *args, **kwargs):
+        self.ui_queue.put((func, args, kwargs))
+
+    def process_ui_queue(self):
+        lines = deque(maxlen=MAX_LOG_LINES)
+        try:
+            while True:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, "".join(lines))
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete(
+                    '1.0', f"{line_count - MAX_LOG_LINES}.0")
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+
+        try:
+            while True:
+                func, args, kwargs = self.ui_queue.get_nowait()
+                func(*args, **kwargs)
+        except queue.Empty:
+            pass
+
+        self.root.after(UI_REFRESH_MS, self.process_ui_queue)
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
             try:
-                with open(CONFIG_FILE, 'r') as f:
-                    saved_config = json.load(f)
-                    self.save_path.set(saved_config.get(
-                        'save_path', self.save_path.get()))
+                options, settings = read_config(CONFIG_FILE)
+                for name, value in options.items():
+                    self.option_vars[name].set(value)
+                self.settings.update(settings)
             except Exception as e:
                 self.log_message(f"⚠️ Could not load config: {e}")
 
     def save_config(self):
         try:
             with open(CONFIG_FILE, 'w') as f:
-                json.dump({'save_path': self.save_path.get()}, f)
+                json.dump({'save_path': self.save_path.get(),
+                           'workers': self.get_worker_count(),
+                           'engine': 'asyncio' if self.async_engine_var.get() else 'threads',
+                           'incremental': self.incremental.get(),
+                           **self.settings}, f, indent=2)
         except Exception as e:
             self.log_message(f"⚠️ Could not save config: {e}")
 
@@ -194,402 +3600,215 @@ class ComicDownloaderGUI:
         self.stop_event.clear()
 
         thread = threading.Thread(
-            target=self.download_comics, args=(selected_comics,))
+            target=self.download_comics, args=(selected_comics, self.custom_url.get().strip()))
         thread.daemon = True
         thread.start()
 
-    def stop_download(self):
-        self.log_message("⚠️ Stopping download process...")
-        self.stop_event.set()
 
-    def download_comics(self, selected_comics):
-        downloaded_count = 0
+class ComicDownloaderDaemon(ComicDownloader):
+    keep_engine = True
+
+    def __init__(self, config_path=CONFIG_FILE, interval=None, **options):
+        saved_options, settings = read_config(config_path) if os.path.exists(config_path) else ({}, {})
+        saved_options.update({name: value for name, value in options.items() if value is not None})
+        super().__init__(settings=settings, **saved_options)
+        self.interval = interval
+        self.shutdown = threading.Event()
+
+    def schedule(self, comic_names=None, need_interval=True):
+        comic_names = comic_names or [name for name, config in self.settings['comics'].items()
+                                      if 'interval' in config]
+        if not comic_names:
+            raise ValueError('no sources to run, name them or give them an "interval" in the config')
+
+        schedule = {}
+        for comic_name in comic_names:
+            config = self.comic_config(comic_name)
+            if not config.get('url'):
+                raise ValueError(f'{comic_name}: no "url" configured')
+            interval = config.get('interval', self.interval)
+            if need_interval and not interval:
+                raise ValueError(f'{comic_name}: no "interval" configured and no --interval given')
+            schedule[comic_name] = float(interval or 0)
+        return schedule
+
+    def stop(self, *_):
+        self.shutdown.set()
+        self.stop_event.set()
 
+    def run_forever(self, schedule):
+        # Sources that fall due together run as one batch; the session, caches, manifest
+        # and per-host politeness all carry over from one poll to the next.
+        due = dict.fromkeys(schedule, time.monotonic())
+        self.log_message("ℹ️ Daemon started: " + ", ".join(
+            f"{comic_name} every {interval:g}s" for comic_name, interval in schedule.items()))
+        while not self.shutdown.is_set():
+            now = time.monotonic()
+            ready = [comic_name for comic_name, at in due.items() if at <= now]
+            if not ready:
+                self.shutdown.wait(min(due.values()) - now)
+                continue
+
+            self.download_comics(ready)
+            for comic_name in ready:
+                due[comic_name] = now + schedule[comic_name]
+            comic_name = min(due, key=due.get)
+            self.log_message(f"ℹ️ Next poll: {comic_name} in {max(0, due[comic_name] - time.monotonic()):.0f}s")
+        self.log_message("ℹ️ Daemon stopped.")
+
+    def shard_manifests(self):
+        stem, ext = os.path.splitext(MANIFEST_FILE)
+        shards = {}
+        for name in os.listdir(self.get_save_path()):
+            if not (name.startswith(stem + '.') and name.endswith(ext)):
+                continue
+            source, _, spec = name[len(stem) + 1:-len(ext)].rpartition('.shard-')
+            index, _, count = spec.partition('-of-')
+            if source and index.isdigit() and count.isdigit():
+                shards[source, int(index), int(count)] = os.path.join(self.get_save_path(), name)
+        return shards
+
+    def merge_shards(self):
+        shards = self.shard_manifests() if os.path.isdir(self.get_save_path()) else {}
+        if not shards:
+            self.log_message(f"❌ No shard manifests found in {self.get_save_path()}")
+            return 2
+
+        manifest = self.ensure_manifest()
+        planned = set()
+        owners = {}
+        contents = {}
+        for (source, index, count), path in sorted(shards.items()):
+            shard = DownloadManifest(path)
+            try:
+                rows = shard.rows()
+                planned |= shard.planned()
+            finally:
+                shard.close()
+            manifest.import_rows(rows)
+            self.log_message(f"📦 Merged {source} shard {index}/{count}: {len(rows)} entries")
+            for row in rows:
+                owners.setdefault(row[:2], []).append(f"{index}/{count}")
+                if row[5]:
+                    contents.setdefault(row[5], set()).add(row[:2])
+
+        problems = 0
+        for source, count in sorted({(source, count) for source, _, count in shards}):
+            missing = [f"{index}/{count}" for index in range(1, count + 1) if (source, index, count) not in shards]
+            if missing:
+                problems += 1
+                self.log_message(f"⚠️ {source}: no manifest for shard {', '.join(missing)}; its IDs are not checked")
+
+        recorded = {row[:2] for row in manifest.rows()}
+        for source in sorted({source for source, _ in planned}):
+            gaps = [comic_id for planned_source, comic_id in planned
+                    if planned_source == source and (source, comic_id) not in recorded]
+            if gaps:
+                problems += 1
+                self.log_message(f"⚠️ {source}: {len(gaps)} planned comics missing: {describe_ids(gaps)}")
+
+        for (source, comic_id), labels in sorted(owners.items()):
+            if len(labels) > 1:
+                problems += 1
+                self.log_message(f"⚠️ {source} {comic_id} was downloaded by shards {', '.join(labels)}")
+        for sha256, comics in contents.items():
+            if len(comics) > 1:
+                problems += 1
+                self.log_message("⚠️ Identical content saved as " + ", ".join(
+                    f"{source} {comic_id}" for source, comic_id in sorted(comics)))
+
+        self.log_message(f"ℹ️ {len(recorded)} comics in {MANIFEST_FILE} after merging {len(shards)} shards, "
+                         f"{len(planned)} planned")
+        if problems:
+            return 1
+        self.log_message("✅ No gaps or duplicates found.")
+        return 0
+
+
+def read_ids(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def run_headless(args):
+    daemon = ComicDownloaderDaemon(args.config, interval=args.interval,
+                                   save_path=args.save_path, max_comics=args.max_comics)
+    if args.merge_shards:
         try:
-            total_comics = len(selected_comics)
-            if self.custom_url.get().strip():
-                total_comics += 1
-
-            if total_comics == 0:
-                self.log_message("No comics selected. Download finished.")
-                return
-
-            self.progress_bar["maximum"] = total_comics
-            self.progress_bar["value"] = 0
-
-            os.makedirs(self.save_path.get(), exist_ok=True)
-            self.save_config()
-
-            for comic_name in selected_comics:
-                if self.stop_event.is_set():
-                    break
-
-                self.progress_label.config(text=f"Downloading {comic_name}...")
-                self.log_message(f"=== Starting {comic_name} Download ===")
-
-                success_count = self.download_single_comic(
-                    comic_name, self.comics_config[comic_name])
-
-                if success_count > 0:
-                    downloaded_count += 1
-                    self.log_message(
-                        f"🎉 {comic_name} finished. Downloaded {success_count} comics.")
-
-                self.progress_bar["value"] += 1
-                self.root.update_idletasks()
-
-            if self.custom_url.get().strip() and not self.stop_event.is_set():
-                self.progress_label.config(text="Downloading custom comic...")
-                self.log_message("=== Starting Custom Comic Download ===")
-
-                custom_name = "Custom_Comic"
-                success_count = self.download_single_comic(
-                    custom_name, self.custom_url.get().strip())
-
-                if success_count > 0:
-                    downloaded_count += 1
-                    self.log_message(
-                        f"🎉 Custom Comic finished. Downloaded {success_count} comics.")
-
-                self.progress_bar["value"] += 1
-                self.root.update_idletasks()
-
-            if not self.stop_event.is_set():
-                final_message = f"Download complete! {downloaded_count} sources processed."
-                self.progress_label.config(text=final_message)
-                self.log_message(
-                    f"=== Finished! {downloaded_count} sources successfully processed ===")
-                messagebox.showinfo("Complete", final_message)
-            else:
-                self.progress_label.config(text="Download stopped by user.")
-                self.log_message("Download process halted by user.")
-
-        except Exception as e:
-            self.log_message(f"❌ Critical Error during download: {str(e)}")
-            messagebox.showerror(
-                "Error", f"A critical error occurred: {str(e)}")
+            return daemon.merge_shards()
         finally:
-            self.download_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.stop_event.clear()
-
-    def download_single_comic(self, comic_name, base_url):
-        if self.stop_event.is_set():
-            return 0
-
-        max_downloads = 1
-        try:
-            max_downloads = int(self.max_comics.get())
-        except ValueError:
-            self.log_message(
-                "Invalid value for Max comics. Using default (1).")
+            daemon.close()
 
-        comic_folder = os.path.join(self.save_path.get(
-        ), comic_name.replace(' & ', '_').replace(' ', '_'))
-        os.makedirs(comic_folder, exist_ok=True)
-
-        if comic_name == "XKCD":
-            return self.download_xkcd(comic_folder, max_downloads)
-        elif comic_name == "Dilbert":
-            return self.download_dilbert(comic_folder, base_url, max_downloads)
-        elif comic_name == "SMBC":
-            return self.download_smbc(comic_folder, base_url)
-        elif comic_name == "The Oatmeal":
-            return self.download_oatmeal(comic_folder, base_url, max_downloads)
-        elif comic_name == "Cyanide & Happiness":
-            return self.download_cyanide(comic_folder, base_url)
+    try:
+        if args.shard:
+            if len(args.sources) != 1:
+                raise ValueError("--shard archives exactly one source, e.g. --shard 1/4 XKCD")
+            daemon.shard = ArchiveShard(args.sources[0], *args.shard, args.range,
+                                        read_ids(args.ids) if args.ids else None)
+            daemon.shard.check()
+            if daemon.settings['cbz_output']:
+                daemon.log_message("ℹ️ CBZ output is skipped in shard runs; shards write to the same folders.")
+        schedule = daemon.schedule(args.sources, need_interval=not (args.once or args.shard))
+    except (OSError, ValueError) as e:
+        daemon.log_message(f"❌ {e}")
+        return 2
+
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        if args.once or args.shard:
+            daemon.download_comics(list(schedule))
         else:
-            return self.download_generic(comic_folder, base_url, max_downloads)
-
-    def _download_image(self, img_url, filepath, filename, referer=None):
-        if not img_url:
-            return False
-
-        if img_url.startswith('//'):
-            img_url = 'https:' + img_url
-        elif not urlparse(img_url).scheme:
-            pass
-
-        if os.path.exists(filepath):
-            self.log_message(f"⏩ Already exists: {filename}")
-            return True
-
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            if referer:
-                headers['Referer'] = referer
-
-            img_response = requests.get(
-                img_url, headers=headers, stream=True, timeout=10)
-            img_response.raise_for_status()
-
-            with open(filepath, 'wb') as f:
-                for chunk in img_response.iter_content(chunk_size=8192):
-                    if self.stop_event.is_set():
-                        f.close()
-                        os.remove(filepath)
-                        return False
-                    f.write(chunk)
-
-            self.log_message(f"✅ Downloaded: {filename}")
-            return True
-        except requests.exceptions.RequestException as e:
-            self.log_message(f"❌ Failed to download image {img_url}: {e}")
-            return False
-        except Exception as e:
-            self.log_message(f"❌ File operation error for {filename}: {e}")
-            return False
-
-    def download_xkcd(self, folder, max_downloads):
-        if self.stop_event.is_set():
-            return 0
-        downloaded = 0
-        try:
-            response = requests.get("https://xkcd.com/info.0.json", timeout=10)
-            response.raise_for_status()
-            latest_num = response.json()["num"]
-
-            for comic_num in range(latest_num, latest_num - max_downloads, -1):
-                if self.stop_event.is_set():
-                    break
-                if comic_num in (404, 0):
-                    continue
-
-                try:
-                    comic_url = f"https://xkcd.com/{comic_num}/info.0.json"
-                    response = requests.get(comic_url, timeout=10)
-                    response.raise_for_status()
-                    comic_data = response.json()
-
-                    img_url = comic_data.get("img")
-                    title = comic_data.get("safe_title", f"comic_{comic_num}")
-
-                    clean_title = "".join(c if c.isalnum() or c in (
-                        ' ', '_') else '' for c in title).strip().replace(' ', '_')
-                    filename = f"xkcd_{comic_num:04d}_{clean_title}.png"
-                    filepath = os.path.join(folder, filename)
-
-                    if self._download_image(img_url, filepath, filename):
-                        downloaded += 1
-
-                except requests.exceptions.HTTPError as e:
-                    self.log_message(
-                        f"⚠️ XKCD #{comic_num} not found or failed (HTTP Error: {e.response.status_code})")
-                except Exception as e:
-                    self.log_message(
-                        f"❌ Failed to download XKCD #{comic_num}: {str(e)}")
-                    continue
-
-        except Exception as e:
-            self.log_message(
-                f"❌ XKCD download failed (Initial check): {str(e)}")
-
-        return downloaded
-
-    def download_dilbert(self, folder, base_url, max_downloads):
-        if self.stop_event.is_set():
-            return 0
-        downloaded = 0
-        current_url = base_url
-
-        try:
-            for _ in range(max_downloads):
-                if self.stop_event.is_set():
-                    break
-
-                response = requests.get(current_url, timeout=10)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                comic_img = soup.find('img', class_='img-responsive img-comic')
-                if not comic_img:
-                    comic_img = soup.find('img', class_='img-comic')
-
-                if not comic_img or not comic_img.get('src'):
-                    self.log_message(
-                        f"⚠️ Dilbert: Could not find comic image on {current_url}")
-                    break
-
-                img_url = comic_img['src']
-
-                path_parts = urlparse(current_url).path.split('/')
-                comic_date = path_parts[-1] if path_parts[-1] else path_parts[-2]
-
-                ext = os.path.splitext(urlparse(img_url).path)[1]
-                filename = f"dilbert_{comic_date}{ext}"
-                filepath = os.path.join(folder, filename)
-
-                if self._download_image(img_url, filepath, filename, referer=current_url):
-                    downloaded += 1
-
-                prev_link_element = soup.find(
-                    'a', class_='btn btn-lg btn-default btn-comic-navigation')
-                next_url = None
-
-                if not prev_link_element:
-                    prev_link = soup.find('a', {'rel': 'prev'})
-                    if prev_link:
-                        next_url = urljoin(base_url, prev_link.get('href'))
-                else:
-                    next_url = urljoin(base_url, prev_link_element.get('href'))
-
-                if not next_url or next_url == current_url:
-                    self.log_message(
-                        "ℹ️ Reached the oldest comic accessible or navigation failed.")
-                    break
-
-                current_url = next_url
-
-        except requests.exceptions.RequestException as e:
-            self.log_message(
-                f"❌ Dilbert download failed on {current_url}: {str(e)}")
-        except Exception as e:
-            self.log_message(
-                f"❌ Dilbert download failed (General Error): {str(e)}")
-
-        return downloaded
-
-    def download_smbc(self, folder, base_url):
-        if self.stop_event.is_set():
-            return 0
-
-        try:
-            response = requests.get(base_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            comic_img = soup.find('img', id='cc-comic')
-            if comic_img and comic_img.get('src'):
-                img_url = comic_img['src']
-                ext = os.path.splitext(urlparse(img_url).path)[1]
-                filename = f"smbc_latest{ext}"
-                filepath = os.path.join(folder, filename)
-
-                if self._download_image(img_url, filepath, filename):
-                    return 1
-
-            self.log_message(
-                "⚠️ SMBC: Could not find the comic image on the main page.")
-            return 0
-
-        except requests.exceptions.RequestException as e:
-            self.log_message(f"❌ SMBC download failed: {str(e)}")
-            return 0
-
-    def download_cyanide(self, folder, base_url):
-        if self.stop_event.is_set():
-            return 0
-
-        try:
-            response = requests.get(base_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            comic_img = soup.find('img', id='main-comic')
-            if comic_img and comic_img.get('src'):
-                img_url = comic_img['src']
-                if img_url.startswith('//'):
-                    img_url = 'https:' + img_url
-
-                ext = os.path.splitext(urlparse(img_url).path)[1]
-                filename = f"cyanide_latest{ext}"
-                filepath = os.path.join(folder, filename)
-
-                if self._download_image(img_url, filepath, filename):
-                    return 1
-
-            self.log_message(
-                "⚠️ Cyanide & Happiness: Could not find the comic image on the latest page.")
-            return 0
-
-        except requests.exceptions.RequestException as e:
-            self.log_message(
-                f"❌ Cyanide & Happiness download failed: {str(e)}")
-            return 0
-
-    def download_oatmeal(self, folder, base_url, max_downloads):
-        if self.stop_event.is_set():
-            return 0
-        downloaded = 0
-
-        try:
-            response = requests.get(base_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            images = soup.find_all('img')
-
-            for img in images:
-                if self.stop_event.is_set():
-                    break
-                img_url = img.get('src')
-
-                if img_url and 'comics/' in img_url and any(ext in img_url.lower() for ext in ['.jpg', '.jpeg', '.png']):
-
-                    full_img_url = urljoin(base_url, img_url)
-
-                    url_path_segment = urlparse(
-                        full_img_url).path.split('/')[-1]
-                    filename = f"oatmeal_{url_path_segment}"
-                    filepath = os.path.join(folder, filename)
-
-                    if self._download_image(full_img_url, filepath, filename, referer=base_url):
-                        downloaded += 1
-                        if downloaded >= max_downloads:
-                            break
-
-            if downloaded == 0:
-                self.log_message(
-                    "⚠️ The Oatmeal: Could not find reliable comic image links on the main page.")
-
-            return downloaded
-
-        except requests.exceptions.RequestException as e:
-            self.log_message(f"❌ The Oatmeal download failed: {str(e)}")
-            return 0
-
-    def download_generic(self, folder, base_url, max_downloads):
-        if self.stop_event.is_set():
-            return 0
-        downloaded = 0
-
-        try:
-            response = requests.get(base_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            images = soup.find_all('img')
-
-            for img in images:
-                if self.stop_event.is_set():
-                    break
-                img_url = img.get('src')
-
-                if img_url and any(ext in img_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif']) and 'icon' not in img_url.lower() and 'logo' not in img_url.lower():
-
-                    full_img_url = urljoin(base_url, img_url)
-
-                    ext = os.path.splitext(urlparse(full_img_url).path)[1]
-                    filename = f"comic_{downloaded+1:03d}{ext}"
-                    filepath = os.path.join(folder, filename)
-
-                    if self._download_image(full_img_url, filepath, filename, referer=base_url):
-                        downloaded += 1
-                        if downloaded >= max_downloads:
-                            break
-
-            if downloaded == 0:
-                self.log_message(
-                    "⚠️ Generic Scraper: Found no relevant images to download.")
-
-            return downloaded
-
-        except requests.exceptions.RequestException as e:
-            self.log_message(f"❌ Generic download failed: {str(e)}")
-            return 0
-
-
-def main():
+            daemon.run_forever(schedule)
+    finally:
+        daemon.close()
+    return 0
+
+
+def shard_spec(value):
+    index, _, count = value.partition('/')
+    if not (index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count)):
+        raise argparse.ArgumentTypeError(f"expected K/N with 1 <= K <= N, got {value!r}")
+    return int(index), int(count)
+
+
+def range_spec(value):
+    first, colon, last = value.partition(':')
+    if not colon:
+        raise argparse.ArgumentTypeError(f"expected FIRST:LAST, got {value!r}")
+    return first.strip(), last.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Web Comic Downloader. Opens the GUI unless --daemon, --once, --shard or --merge-shards is given.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true",
+                      help="keep running and poll each source on its own schedule")
+    mode.add_argument("--once", action="store_true", help="download the sources once and exit")
+    mode.add_argument("--shard", type=shard_spec, metavar="K/N",
+                      help="bulk archive: download shard K of N of each source's IDs, then exit")
+    mode.add_argument("--merge-shards", action="store_true",
+                      help="merge the shard manifests in the save path and check for gaps and duplicates")
+    parser.add_argument("sources", nargs="*", metavar="SOURCE",
+                        help='sources to run (default: every source with an "interval" in the config)')
+    parser.add_argument("--config", default=CONFIG_FILE, help=f"config file (default: {CONFIG_FILE})")
+    parser.add_argument("--interval", type=float,
+                        help='seconds between polls for sources without their own "interval"')
+    parser.add_argument("--save-path")
+    parser.add_argument("--max-comics", type=int)
+    parser.add_argument("--range", type=range_spec, metavar="FIRST:LAST",
+                        help="with --shard: XKCD numbers or Dilbert dates (XKCD default: all comics)")
+    parser.add_argument("--ids", metavar="FILE",
+                        help="with --shard: file with one XKCD number, Dilbert date or strip URL per line")
+    args = parser.parse_args(argv)
+
+    if (args.range or args.ids) and not args.shard:
+        parser.error("--range and --ids need --shard")
+    if args.daemon or args.once or args.shard or args.merge_shards:
+        return run_headless(args)
+
+    load_tk()
     root = tk.Tk()
 
     try:
@@ -603,9 +3822,9 @@ def main():
     except tk.TclError:
         pass
 
-    app = ComicDownloaderGUI(root)
+    ComicDownloaderGUI(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import os
+import struct
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "benchmarks"))
+
+import comic  # noqa: E402
+from comic_server import ComicServer, png_bytes  # noqa: E402
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ComicServer(image_size=8 * 1024, xkcd_latest=30, gallery_size=4).start()
+    yield server
+    server.stop()
+
+
+def downloader(save_path, server, cls=comic.ComicDownloader, **kwargs):
+    comics = {name: {'url': url, 'rate': 0} for name, url in server.comic_urls().items()}
+    comics["Custom_Comic"] = {'rate': 0}
+    settings = {'comics': comics, **kwargs.pop('settings', {})}
+    return cls(save_path=str(save_path), settings=settings, **kwargs)
+
+
+@pytest.mark.skipif(not hasattr(os, 'posix_fallocate'), reason="needs posix_fallocate")
+def test_preallocated_part_resumes_from_last_checkpoint(tmp_path):
+    filepath = str(tmp_path / "big.png")
+    part = comic.PartFile(filepath)
+    part.open(200, {'Content-Length': str(6 * MB)})
+    for _ in range(5):
+        part.write(b'x' * MB)
+    part.file.close()  # the process dies without PartFile.close()
+
+    assert os.path.getsize(filepath + '.part') == 6 * MB
+    resumed = comic.PartFile(filepath)
+    assert resumed.offset == comic.PART_CHECKPOINT
+    assert os.path.getsize(filepath + '.part') == comic.PART_CHECKPOINT
+    assert not os.path.exists(filepath + '.part.len')
+
+
+def test_rejected_resume_restarts_in_the_same_run(tmp_path, server):
+    body = server.image("/images/bench/full.png")
+    folder = tmp_path / "Bench"
+    folder.mkdir()
+    filepath = str(folder / "full.png")
+    with open(filepath + '.part', 'wb') as f:
+        f.write(b'\0' * len(body))  # full length, as left by a crash after preallocating
+
+    app = downloader(tmp_path, server)
+    app.ensure_manifest()
+    app.ensure_http_client()
+    try:
+        assert app._fetch_image(server.base_url + "/images/bench/full.png", filepath, "full.png", None, None, 1)
+    finally:
+        app.close()
+    with open(filepath, 'rb') as f:
+        assert f.read() == body
+
+
+def test_content_store_ingest_links_instead_of_copying(tmp_path):
+    store = comic.ContentStore(str(tmp_path / ".content_store"))
+    image = tmp_path / "comic_001.png"
+    image.write_bytes(b"image bytes")
+    inode = os.stat(image).st_ino
+
+    store.ingest(str(image), "ab" * 32)
+    assert os.stat(image).st_ino == inode
+    assert os.path.samefile(store.blob_path("ab" * 32), image)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_shifted_gallery_relinks_moved_images_from_the_store(tmp_path, server, monkeypatch, engine):
+    route = server.route
+    fetched = []
+
+    def shifted(path):
+        if path.startswith("/images/gallery/"):
+            fetched.append(path)
+        routed = route(path)
+        if path == "/gallery/" and shift:
+            content_type, body = routed
+            return content_type, body.replace(b"<main>", b"<main><img src='/images/gallery/new_top.jpg'>", 1)
+        return routed
+
+    def run():
+        app = downloader(tmp_path, server, async_engine=engine == "asyncio", settings={'content_store': True})
+        app.download_comics([], custom_url=server.gallery_url())
+        app.close()
+
+    monkeypatch.setattr(server, "route", shifted)
+    shift = False
+    run()
+    shift = True
+    fetched.clear()
+    run()
+
+    assert fetched == ["/images/gallery/new_top.jpg"]
+    expected = ["new_top.jpg"] + [f"strip_{i}.jpg" for i in range(4)]
+    folder = tmp_path / "Custom_Comic"
+    for position, name in enumerate(expected, start=1):
+        saved = [entry for entry in os.listdir(folder) if entry.startswith(f"comic_{position:03d}.")]
+        assert saved, name
+        assert all((folder / entry).read_bytes() == server.image(f"/images/gallery/{name}") for entry in saved)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_second_crawl_downloads_nothing(tmp_path, monkeypatch, engine):
+    server = ComicServer(image_size=4 * 1024, site_pages=6, latency=0.01, seed=1).start()
+    route = server.route
+    fetched = []
+
+    def counted(path):
+        if path.startswith("/images/"):
+            fetched.append(path)
+        return route(path)
+
+    def run():
+        app = downloader(tmp_path, server, async_engine=engine == "asyncio", workers=4, max_comics=100,
+                         settings={'crawl_pages': 10})
+        app.download_comics([], custom_url=server.site_url())
+        app.close()
+
+    monkeypatch.setattr(server, "route", counted)
+    try:
+        run()
+        assert len(fetched) == 12
+        fetched.clear()
+        run()
+    finally:
+        server.stop()
+
+    assert fetched == []
+    folder = tmp_path / "Custom_Comic"
+    saved = sorted(entry for entry in os.listdir(folder) if not entry.startswith("."))
+    assert len(saved) == 12
+    for entry in saved:
+        stem, ext = os.path.splitext(entry)
+        assert (folder / entry).read_bytes() == server.image(f"/images/site/{stem.rsplit('_', 1)[0]}{ext}")
+
+
+def build_cbz(path, folder, count, size=1024):
+    archive = comic.CbzArchive(path)
+    for i in range(count):
+        image = os.path.join(folder, f"{i:04d}.png")
+        with open(image, 'wb') as f:
+            f.write(os.urandom(size))
+        archive.add(image, os.path.basename(image))
+    archive.close()
+
+
+def test_cbz_reopens_after_crash_over_the_old_directory(tmp_path):
+    path = str(tmp_path / "Comic.cbz")
+    build_cbz(path, str(tmp_path), 300)
+    image = str(tmp_path / "new.png")
+    with open(image, 'wb') as f:
+        f.write(os.urandom(3 * 1024))
+
+    # The new entry is shorter than the old central directory, so the stale end record survives.
+    code = ("import os, sys; sys.path.insert(0, sys.argv[1]); import comic\n"
+            "archive = comic.CbzArchive(sys.argv[2]); archive.add(sys.argv[3], 'new.png')\n"
+            "archive.zip.fp.flush(); os._exit(1)")
+    subprocess.run([sys.executable, "-c", code, os.path.dirname(TESTS_DIR), path, image], check=False)
+
+    archive = comic.CbzArchive(path)
+    assert archive.salvaged == 301
+    assert len(archive.names) == 301
+    archive.close()
+    with zipfile.ZipFile(path) as z:
+        assert len(z.namelist()) == 301
+        assert z.testzip() is None
+
+
+def test_salvage_zip_drops_a_half_written_entry(tmp_path):
+    path = str(tmp_path / "Comic.cbz")
+    build_cbz(path, str(tmp_path), 3, size=4096)
+    with zipfile.ZipFile(path) as z:
+        cut = z.getinfo("0002.png").header_offset + 100
+    with open(path, 'r+b') as f:
+        f.truncate(cut)
+
+    assert comic.salvage_zip(path) == 2
+    with zipfile.ZipFile(path) as z:
+        assert z.namelist() == ["0000.png", "0001.png"]
+        assert z.testzip() is None
+
+
+def test_clean_cbz_is_not_salvaged(tmp_path):
+    path = str(tmp_path / "Comic.cbz")
+    build_cbz(path, str(tmp_path), 0)
+    build_cbz(path, str(tmp_path), 2)
+    archive = comic.CbzArchive(path)
+    assert archive.salvaged is None
+    assert archive.names == {"0000.png", "0001.png"}
+    archive.close()
+
+
+class StoppingDownloader(comic.ComicDownloader):
+    stop_after = None
+
+    def _download_xkcd_comic(self, folder, base_url, comic_num, position):
+        saved = super()._download_xkcd_comic(folder, base_url, comic_num, position)
+        if comic_num == self.stop_after:
+            self.stop_event.set()
+        return saved
+
+
+def test_resumed_xkcd_run_keeps_the_mark_below_earlier_failures(tmp_path, server, monkeypatch):
+    manifest = comic.DownloadManifest(str(tmp_path / comic.MANIFEST_FILE))
+    manifest.set_mark("XKCD", 20)
+    manifest.close()
+
+    route = server.route
+    monkeypatch.setattr(server, "route", lambda path: None if path == "/xkcd/25/info.0.json" else route(path))
+
+    def run(stop_after=None):
+        app = downloader(tmp_path, server, StoppingDownloader, workers=1, incremental=True, max_comics=100)
+        app.stop_after = stop_after
+        app.download_comics(["XKCD"])
+        mark, has_25 = app.manifest.get_mark("XKCD"), app.manifest.get("XKCD", 25) is not None
+        app.close()
+        return mark, has_25
+
+    assert run(stop_after=24) == ("20", False)  # #25 failed, #23-#21 are left in the work queue
+    assert run() == ("24", False)               # resumes #23-#21 only; #25 still holds the mark back
+
+    monkeypatch.setattr(server, "route", route)
+    assert run() == ("30", True)
+
+
+def jpeg_bytes(width, height, prolog=0):
+    segments = b''
+    while prolog > 0:
+        block = min(prolog, 0xFFFF - 2)
+        segments += b'\xff\xe1' + struct.pack('>H', block + 2) + b'\0' * block
+        prolog -= block
+    frame = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    scan = b'\xff\xda' + struct.pack('>HB', 8, 1) + b'\x01\x00\x00\x3f\x00' + b'\x55' * 4096
+    return b'\xff\xd8' + segments + frame + scan + b'\xff\xd9'
+
+
+def gif_bytes(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height) + b'\x00\x00\x00' + b'\x01' * 2048 + b'\x00;'
+
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"><rect/></svg>'
+
+
+@pytest.mark.parametrize("body, expected", [
+    (png_bytes('a', 4096), ('png', 640, 480, None)),
+    (png_bytes('a', 4096) + b'trailer' * 300, ('png', 640, 480, None)),
+    (png_bytes('a', 4096)[:-40], ('png', 640, 480, "truncated body")),
+    (jpeg_bytes(720, 477), ('jpeg', 720, 477, None)),
+    (jpeg_bytes(720, 477) + b'\0' * 32, ('jpeg', 720, 477, None)),
+    (jpeg_bytes(720, 477) + b'APPENDED TRAILER' * 128, ('jpeg', 720, 477, None)),
+    (jpeg_bytes(600, 400, prolog=100 * 1024), ('jpeg', 600, 400, None)),
+    (jpeg_bytes(720, 477)[:-500], ('jpeg', 720, 477, "truncated body")),
+    (gif_bytes(16, 16) + b'\0' * 64, ('gif', 16, 16, None)),
+    (gif_bytes(16, 16)[:-100], ('gif', 16, 16, "truncated body")),
+    (png_bytes('a', 4096)[:16] + struct.pack('>II', 0, 5) + png_bytes('a', 4096)[24:],
+     ('png', 0, 5, "invalid dimensions 0x5")),
+    (SVG, ('svg', 0, 0, None)),
+    (b'<?xml version="1.0"?>\n<!-- ' + b'generated ' * 200 + b'-->\n' + SVG + b'\n', ('svg', 0, 0, None)),
+    (SVG[:-10], ('svg', 0, 0, "truncated SVG")),
+    (b'<!DOCTYPE html><html><body><svg></svg>Not found</body></html>',
+     (None, 0, 0, "HTML page instead of an image")),
+    (b'{"error": "rate limited"}', (None, 0, 0, "text response instead of an image")),
+    (b'', (None, 0, 0, "empty file")),
+    (b'II*\x00' + b'\0' * 64, ('tiff', 0, 0, None)),
+    (b'\x01\x02\x03 some other binary format', (None, 0, 0, None)),
+], ids=["png", "png-trailer", "png-truncated", "jpeg", "jpeg-padded", "jpeg-trailer", "jpeg-long-exif",
+        "jpeg-truncated", "gif-padded", "gif-truncated", "png-zero-width", "svg", "svg-long-prolog",
+        "svg-truncated", "html", "json", "empty", "tiff", "unknown-binary"])
+def test_sniff_image(tmp_path, body, expected):
+    path = tmp_path / "image"
+    path.write_bytes(body)
+    assert comic.sniff_image(str(path)) == expected